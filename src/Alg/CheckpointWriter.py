@@ -0,0 +1,98 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import gzip
+import os
+import queue
+import threading
+
+
+def write_compressed(filename, payload, compresslevel=5):
+    """
+    Write already pickled data compressed with gzip
+    :param filename: path of the file
+    :param payload: bytes
+    :param compresslevel: gzip compression level
+    :return:
+    """
+    with gzip.open(filename, 'w', compresslevel=compresslevel) as f:
+        f.write(payload)
+
+
+def write_atomically(filename, write):
+    """
+    Write the file under a temporary name and then rename it, a checkpoint is either complete or not there
+    :param filename: path of the file
+    :param write: function writing the file, it takes the path where to write
+    :return:
+    """
+    temporary_filename = "{}.{}.tmp".format(filename, os.getpid())
+    try:
+        write(filename=temporary_filename)
+        os.replace(temporary_filename, filename)
+    finally:
+        if os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+
+
+class CheckpointWriter(object):
+    """
+    Writes the checkpoints on a background thread, so the next generation starts while the previous one is compressed
+    and written.
+    The data given has to be a snapshot the run does not change anymore. At most max_pending checkpoints wait to be
+    written, when there are more the run waits
+    """
+
+    def __init__(self, max_pending=1, logger=None):
+        self._log = logger
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            filename, write, done = item
+            try:
+                write_atomically(filename=filename, write=write)
+                if done is not None:
+                    done()
+            except Exception as e:
+                if self._log is not None:
+                    self._log.error("Error writing the checkpoint {}: {}".format(filename, e))
+                else:
+                    print("Error writing the checkpoint {}: {}".format(filename, e))
+
+    def submit(self, filename, write, done=None):
+        """
+        Write a checkpoint in background
+        :param filename: path of the checkpoint
+        :param write: function writing the checkpoint, it takes the path where to write
+        :param done: function called after the checkpoint is written
+        :return:
+        """
+        self._queue.put((filename, write, done))
+
+    def close(self):
+        """
+        Wait for the checkpoints still to write
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
@@ -15,12 +15,18 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import functools
+import glob
 import gzip
+import itertools
+import os
 import pickle
 import random
 import time
 from neat import Checkpointer
 
+from src.Alg.CheckpointWriter import CheckpointWriter, write_atomically, write_compressed
+from src.Alg.CompactCheckpoint import make_snapshot, write_snapshot, is_snapshot, restore_snapshot
 from src.Alg.population_mine import PopulationWithNovelty
 
 
@@ -30,8 +36,41 @@ class CheckpointerMine(Checkpointer):
     to save and restore populations (and other aspects of the simulation state).
     """
     def __init__(self, generation_interval=100, time_interval_seconds=300,
-                 filename_prefix='neat-checkpoint-'):
+                 filename_prefix='neat-checkpoint-', archive=None, compact=False, compresslevel=None, keep_last=0,
+                 reproduction=None, background=False, logger=None):
+        """
+        :param archive: novelty archive saved with the population
+        :param compact: save only genes, species, random state and archive (CompactCheckpoint) instead of pickling
+                        population, species set and config with all the data of the evaluation
+        :param compresslevel: gzip compression level, None for 1 with the compact format and 5 otherwise
+        :param keep_last: number of checkpoints to keep, the older ones are removed. 0 to keep all of them
+        :param reproduction: reproduction of the population, the compact format saves the next key of the genomes
+        :param background: compress and write the checkpoints on a background thread (CheckpointWriter), call close
+                           at the end of the run
+        :param logger: logger
+        """
         super().__init__(generation_interval, time_interval_seconds, filename_prefix)
+        self._archive = archive
+        self._compact = compact
+        if compresslevel is None:
+            compresslevel = 1 if compact else 5
+        self._compresslevel = compresslevel
+        self._keep_last = keep_last
+        self._reproduction = reproduction
+        self._writer = CheckpointWriter(logger=logger) if background else None
+
+    def __getstate__(self):
+        # the full checkpoints pickle the reporters, the writer thread is not part of them
+        state = self.__dict__.copy()
+        state["_writer"] = None
+        return state
+
+    def close(self):
+        """
+        Wait for the checkpoints still written in background
+        """
+        if self._writer is not None:
+            self._writer.close()
 
     def end_generation(self, config, population, species_set):
         checkpoint_due = False
@@ -46,6 +85,13 @@ class CheckpointerMine(Checkpointer):
             if dg >= self.generation_interval:
                 checkpoint_due = True
 
+        if checkpoint_due and self._compact:
+            # the reporters are not saved, no need to remove the loggers
+            self.save_checkpoint(config, population, species_set, self.current_generation)
+            self.last_generation_checkpoint = self.current_generation
+            self.last_time_checkpoint = time.time()
+            return
+
         # remove log and mlflow from species_set
         log1, log2 = species_set.reporters.reporters[0].get_loggers()
         species_set.reporters.reporters[0].set_logger_none()
@@ -56,11 +102,64 @@ class CheckpointerMine(Checkpointer):
             self.last_time_checkpoint = time.time()
         species_set.reporters.reporters[0].set_loggers(mlflow=log1, logger=log2)
 
+    def save_checkpoint(self, config, population, species_set, generation):
+        """ Save the current simulation state, with the novelty archive. """
+        filename = '{0}{1}'.format(self.filename_prefix, generation)
+        print("Saving checkpoint to {0}".format(filename))
+
+        # the snapshot is taken now, only compression and writing can happen while the run goes on
+        if self._compact:
+            snapshot = make_snapshot(generation=generation, population=population, species_set=species_set,
+                                     archive=self._archive, reproduction=self._reproduction)
+            write = functools.partial(write_snapshot, snapshot=snapshot, compresslevel=self._compresslevel)
+        else:
+            data = (generation, config, population, species_set, random.getstate(), self._archive)
+            payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+            write = functools.partial(write_compressed, payload=payload, compresslevel=self._compresslevel)
+
+        if self._writer is not None:
+            self._writer.submit(filename=filename, write=write, done=self._remove_old_checkpoints)
+        else:
+            write_atomically(filename=filename, write=write)
+            self._remove_old_checkpoints()
+
+    def _remove_old_checkpoints(self):
+        """
+        Keep only the last keep_last checkpoints with the prefix of this checkpointer
+        """
+        if self._keep_last <= 0:
+            return
+        checkpoints = []
+        for filename in glob.glob('{0}*'.format(glob.escape(self.filename_prefix))):
+            generation = filename[len(self.filename_prefix):]
+            if generation.isdigit():
+                checkpoints.append((int(generation), filename))
+        for _, filename in sorted(checkpoints)[:-self._keep_last]:
+            os.remove(filename)
+
     @staticmethod
-    def restore_checkpoint_with_novelty(filename, output_directory, prob_add):
-        """Resumes the simulation from a previous saved point."""
+    def restore_checkpoint_with_novelty(filename, output_directory, prob_add, archive_size=None, config=None):
+        """Resumes the simulation from a previous saved point.
+        The checkpoint of generation g is saved at the end of the generation with the population built for the next
+        one, so the run restarts from generation g + 1, as if it was never interrupted: the random choices of the
+        trajectories and the evaluations in the journal depend on the generation.
+        The checkpoints saved before the archive was stored restart with an empty archive.
+        The compact checkpoints do not contain the config, it has to be given"""
         with gzip.open(filename) as f:
-            generation, config, population, species_set, rndstate = pickle.load(f)
+            data = pickle.load(f)
+            if is_snapshot(data):
+                generation, population, species_set, archive, next_genome = restore_snapshot(snapshot=data,
+                                                                                             config=config)
+                restored = PopulationWithNovelty(config=config, prob_add=prob_add, output_directory=output_directory,
+                                                 initial_state=(population, species_set, generation + 1),
+                                                 archive_size=archive_size, archive=archive)
+                restored.species.reporters = restored.reporters
+                if next_genome is not None:
+                    restored.reproduction.genome_indexer = itertools.count(next_genome)
+                return restored
+            generation, config, population, species_set, rndstate = data[:5]
+            archive = data[5] if len(data) > 5 else None
             random.setstate(rndstate)
             return PopulationWithNovelty(config=config, prob_add=prob_add, output_directory=output_directory,
-                                         initial_state=(population, species_set, generation))
+                                         initial_state=(population, species_set, generation + 1),
+                                         archive_size=archive_size, archive=archive)
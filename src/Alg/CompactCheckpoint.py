@@ -0,0 +1,150 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import gzip
+import itertools
+import pickle
+import random
+
+import numpy as np
+from neat.reporting import ReporterSet
+from neat.species import Species
+
+COMPACT_FORMAT = "compact-1"
+
+
+def _genes(genes):
+    """
+    Plain values of the genes: key and the value of every attribute
+    :param genes: dictionary key -> gene
+    :return: list of tuples
+    """
+    return [(gene.key,) + tuple(getattr(gene, a.name) for a in gene._gene_attributes) for gene in genes.values()]
+
+
+def _genome_snapshot(genome):
+    return genome.key, genome.fitness, _genes(genome.nodes), _genes(genome.connections)
+
+
+def _next_value(counter):
+    """
+    Next value of an itertools.count, without losing it
+    :param counter: itertools.count
+    :return: value and the count to use instead
+    """
+    value = next(counter)
+    return value, itertools.count(value)
+
+
+def make_snapshot(generation, population, species_set, archive, reproduction=None):
+    """
+    Everything needed to continue the run, as plain values: genes of the genomes, species membership, random state
+    and novelty archive. The trajectories and the other data of the evaluation are not part of it.
+    The snapshot does not share anything with the population, it can be written while the run goes on
+    :param generation: current generation
+    :param population: dictionary genome id -> genome
+    :param species_set: species set
+    :param archive: novelty Archive
+    :param reproduction: reproduction, to continue the keys of the genomes
+    :return: dictionary
+    """
+    genomes = dict(population)
+    for species in species_set.species.values():
+        # the representatives are genomes of the population, but it is not required
+        genomes.setdefault(species.representative.key, species.representative)
+    species = [(s.key, s.created, s.last_improved, s.representative.key, list(s.members.keys()), s.fitness,
+                s.adjusted_fitness, list(s.fitness_history)) for s in species_set.species.values()]
+    next_species, species_set.indexer = _next_value(species_set.indexer)
+    next_genome = None
+    if reproduction is not None:
+        next_genome, reproduction.genome_indexer = _next_value(reproduction.genome_indexer)
+    return {
+        "format": COMPACT_FORMAT,
+        "generation": generation,
+        "population": list(population.keys()),
+        "genomes": [_genome_snapshot(genome) for genome in genomes.values()],
+        "species": species,
+        "next_species": next_species,
+        "next_genome": next_genome,
+        "random_state": random.getstate(),
+        "numpy_random_state": np.random.get_state(),
+        "archive": pickle.dumps(archive, protocol=pickle.HIGHEST_PROTOCOL),
+    }
+
+
+def write_snapshot(filename, snapshot, compresslevel=1):
+    """
+    Write the snapshot
+    :param filename: path of the checkpoint
+    :param snapshot: result of make_snapshot
+    :param compresslevel: gzip compression level, 1 is the fastest
+    :return:
+    """
+    with gzip.open(filename, 'w', compresslevel=compresslevel) as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def is_snapshot(data):
+    return isinstance(data, dict) and data.get("format") == COMPACT_FORMAT
+
+
+def _restore_genes(gene_type, values):
+    genes = {}
+    for value in values:
+        gene = gene_type(value[0])
+        for a, attribute_value in zip(gene_type._gene_attributes, value[1:]):
+            setattr(gene, a.name, attribute_value)
+        genes[gene.key] = gene
+    return genes
+
+
+def restore_snapshot(snapshot, config):
+    """
+    Rebuild the population and the species from the snapshot and restore the random state
+    The species set has no reporters, they are the ones of the population that is going to use it
+    :param snapshot: data written by write_snapshot
+    :param config: NEAT config
+    :return: generation, population, species set, archive, next key of the genomes (None if unknown)
+    """
+    genomes = {}
+    for key, fitness, nodes, connections in snapshot["genomes"]:
+        genome = config.genome_type(key)
+        genome.nodes = _restore_genes(gene_type=config.genome_config.node_gene_type, values=nodes)
+        genome.connections = _restore_genes(gene_type=config.genome_config.connection_gene_type, values=connections)
+        genome.fitness = fitness
+        genomes[key] = genome
+
+    generation = snapshot["generation"]
+    population = {key: genomes[key] for key in snapshot["population"]}
+    species_set = config.species_set_type(config.species_set_config, ReporterSet())
+    for key, created, last_improved, representative, members, fitness, adjusted_fitness, fitness_history in \
+            snapshot["species"]:
+        species = Species(key, created)
+        species.last_improved = last_improved
+        species.update(genomes[representative], {gid: genomes[gid] for gid in members})
+        species.fitness = fitness
+        species.adjusted_fitness = adjusted_fitness
+        species.fitness_history = fitness_history
+        species_set.species[key] = species
+        for gid in members:
+            species_set.genome_to_species[gid] = key
+    species_set.indexer = itertools.count(snapshot["next_species"])
+
+    random.setstate(snapshot["random_state"])
+    np.random.set_state(snapshot["numpy_random_state"])
+    archive = pickle.loads(snapshot["archive"])
+    return generation, population, species_set, archive, snapshot["next_genome"]
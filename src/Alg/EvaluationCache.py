@@ -0,0 +1,89 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import hashlib
+from collections import OrderedDict
+
+from neat.six_util import iteritems
+
+
+def genome_hash(genome, settings=""):
+    """
+    Canonical hash of what defines the network of the genome: enabled connections with their weights and nodes with
+    bias, response, activation and aggregation, plus the settings of the evaluation.
+    Two genomes with the same hash have the same network, not the same trajectories: the random choices of the
+    trajectories (starting points and ties) come from random_streams, which depend on seed, generation and genome key
+    :param genome: NEAT genome
+    :param settings: string with the settings of the evaluation
+    :return: hex digest
+    """
+    nodes = sorted((key, repr(float(ng.bias)), repr(float(ng.response)), ng.activation, ng.aggregation)
+                   for key, ng in iteritems(genome.nodes))
+    connections = sorted((key, repr(float(cg.weight))) for key, cg in iteritems(genome.connections) if cg.enabled)
+    return hashlib.sha1(repr((nodes, connections, settings)).encode("utf-8")).hexdigest()
+
+
+class EvaluationCache(object):
+    """
+    LRU cache of the evaluations of the genomes, keyed by the canonical hash of the genome.
+    The elites and the identical children are not evaluated again. Only what the workers return is cached, the
+    novelty is computed again against the current population.
+    The key does not contain generation and genome key, so a hit reuses the first evaluation of the network even if
+    the random streams of the new genome would generate different trajectories (random starting points, ties)
+    """
+
+    def __init__(self, maxsize, settings=""):
+        """
+        :param maxsize: max number of evaluations kept
+        :param settings: string with the settings of the evaluation, part of the key
+        """
+        self._maxsize = maxsize
+        self._settings = settings
+        self._results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, genome):
+        return genome_hash(genome=genome, settings=self._settings)
+
+    def get(self, key):
+        """
+        Return the evaluation stored with the key
+        :param key: hash of the genome
+        :return: evaluation or None if not present
+        """
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.hits += 1
+            return self._results[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, result):
+        """
+        Store the evaluation, removing the least recently used ones if the cache is full
+        :param key: hash of the genome
+        :param result: evaluation
+        :return:
+        """
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self._maxsize:
+            self._results.popitem(last=False)
+
+    def __len__(self):
+        return len(self._results)
@@ -0,0 +1,106 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+
+import numpy as np
+
+from src.Alg.EvaluationCache import genome_hash
+from src.Alg.ParallelEvaluatorMine import RESULT_DTYPE
+
+# one entry per evaluated genome: generation, key and hash of the genome and what the worker returned for it
+JOURNAL_DTYPE = np.dtype([("generation", np.int64), ("genome_key", np.int64), ("hash", "S40"),
+                          ("result", RESULT_DTYPE)])
+
+
+class EvaluationJournal(object):
+    """
+    Append-only file with the evaluation of every genome, written as soon as the evaluation arrives.
+    When the run is restored, the genomes of a generation already evaluated before the interruption are not evaluated
+    again. The random choices of the trajectories depend on the seed of the run, the generation and the key of the
+    genome, and the trajectories on the network and the settings of the evaluation: an evaluation is reused only if
+    all of them are the same. The same network in another generation or with another key is evaluated again.
+    Only the RESULT_DTYPE record is written, the trajectories of the genomes taken from the journal are not available
+    """
+
+    def __init__(self, path, seed=None, settings=""):
+        """
+        :param path: file of the journal, the entries already there are replayed
+        :param seed: seed of the random choices of the trajectories
+        :param settings: string with the settings of the evaluation
+        """
+        # the hash of the genome covers the network, the seed and the settings
+        self._settings = repr((seed, settings))
+        self._entries = {}
+        self.replayed = 0
+        if os.path.isfile(path):
+            self._replay(path=path)
+        self._file = open(path, 'ab')
+
+    def _replay(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        # the last entry can be incomplete if the run died while writing it
+        complete = len(data) - len(data) % JOURNAL_DTYPE.itemsize
+        for entry in np.frombuffer(data[:complete], dtype=JOURNAL_DTYPE):
+            self._entries[(int(entry["generation"]), int(entry["genome_key"]), entry["hash"].decode("ascii"))] = \
+                entry["result"].copy()
+        if complete != len(data):
+            with open(path, 'r+b') as f:
+                f.truncate(complete)
+
+    def _key(self, genome, generation):
+        # generation and key of the genome define its random streams, they are compared as they are
+        return generation, genome.key, genome_hash(genome=genome, settings=self._settings)
+
+    def get(self, genome, generation):
+        """
+        Evaluation of the genome in the generation, if it is in the journal
+        :param genome: NEAT genome
+        :param generation: generation
+        :return: RESULT_DTYPE record and None instead of the trajectories, or None if not in the journal
+        """
+        if generation is None:
+            return None
+        record = self._entries.get(self._key(genome=genome, generation=generation))
+        if record is None:
+            return None
+        self.replayed += 1
+        return record, None
+
+    def append(self, genome, generation, result):
+        """
+        Write the evaluation of the genome
+        :param genome: NEAT genome
+        :param generation: generation
+        :param result: RESULT_DTYPE record
+        :return:
+        """
+        if generation is None:
+            return
+        key = self._key(genome=genome, generation=generation)
+        entry = np.zeros((), dtype=JOURNAL_DTYPE)
+        entry["generation"], entry["genome_key"], entry["hash"] = key[0], key[1], key[2].encode("ascii")
+        entry["result"] = result
+        self._file.write(entry.tobytes())
+        self._file.flush()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,186 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import numpy as np
+from neat.graphs import feed_forward_layers
+from neat.six_util import itervalues
+
+
+def _selu(z):
+    lam = 1.0507009873554804934193349852946
+    alpha = 1.6732632423543772848170429916717
+    return np.where(z > 0.0, lam * z, lam * alpha * (np.exp(np.minimum(z, 0.0)) - 1))
+
+
+def _inv(z):
+    with np.errstate(divide='ignore', over='ignore'):
+        inverse = 1.0 / z
+    return np.where((z == 0.0) | ~np.isfinite(inverse), 0.0, inverse)
+
+
+# numpy version of the activation functions of neat-python, same clamping of the input
+ACTIVATIONS = {
+    "sigmoid": lambda z: 1.0 / (1.0 + np.exp(-np.clip(5.0 * z, -60.0, 60.0))),
+    "tanh": lambda z: np.tanh(np.clip(2.5 * z, -60.0, 60.0)),
+    "sin": lambda z: np.sin(np.clip(5.0 * z, -60.0, 60.0)),
+    "gauss": lambda z: np.exp(-5.0 * np.clip(z, -3.4, 3.4) ** 2),
+    "relu": lambda z: np.where(z > 0.0, z, 0.0),
+    "elu": lambda z: np.where(z > 0.0, z, np.exp(np.minimum(z, 0.0)) - 1),
+    "lelu": lambda z: np.where(z > 0.0, z, 0.005 * z),
+    "selu": _selu,
+    "softplus": lambda z: 0.2 * np.log(1 + np.exp(np.clip(5.0 * z, -60.0, 60.0))),
+    "identity": lambda z: z,
+    "clamped": lambda z: np.clip(z, -1.0, 1.0),
+    "inv": _inv,
+    "log": lambda z: np.log(np.maximum(1e-7, z)),
+    "exp": lambda z: np.exp(np.clip(z, -60.0, 60.0)),
+    "abs": np.abs,
+    "hat": lambda z: np.maximum(0.0, 1 - np.abs(z)),
+    "square": lambda z: z ** 2,
+    "cube": lambda z: z ** 3
+}
+
+# numpy version of the aggregation functions of neat-python, applied on the weighted inputs of the node
+AGGREGATIONS = {
+    "product": lambda x: np.prod(x, axis=1),
+    "max": lambda x: np.max(x, axis=1),
+    "min": lambda x: np.min(x, axis=1),
+    "maxabs": lambda x: x[np.arange(x.shape[0]), np.argmax(np.abs(x), axis=1)],
+    "median": lambda x: np.median(x, axis=1),
+    "mean": lambda x: np.mean(x, axis=1)
+}
+
+
+class FeedForwardNetworkMine(object):
+    """
+    Feed forward network compiled into one dense weight matrix per layer, following the same topological order of
+    neat.nn.FeedForwardNetwork.
+    It returns the same outputs of neat.nn.FeedForwardNetwork (up to the order of the floating point sums) and it
+    can activate many input rows at once
+    """
+
+    def __init__(self, number_of_nodes, number_of_inputs, output_columns, layers):
+        self._number_of_nodes = number_of_nodes
+        self._number_of_inputs = number_of_inputs
+        self._output_columns = output_columns
+        self._layers = layers
+
+    def activate(self, inputs):
+        """
+        Activate the network on a single input
+        :param inputs: list of inputs
+        :return: list of outputs
+        """
+        if self._number_of_inputs != len(inputs):
+            raise RuntimeError("Expected {0:n} inputs, got {1:n}".format(self._number_of_inputs, len(inputs)))
+        return self.activate_batch(np.array([inputs], dtype=float))[0].tolist()
+
+    def activate_batch(self, inputs):
+        """
+        Activate the network on all the rows of the input
+        :param inputs: matrix (m, number of inputs)
+        :return: matrix (m, number of outputs)
+        """
+        if self._number_of_inputs != inputs.shape[1]:
+            raise RuntimeError("Expected {0:n} inputs, got {1:n}".format(self._number_of_inputs, inputs.shape[1]))
+        values = np.zeros((inputs.shape[0], self._number_of_nodes))
+        values[:, :self._number_of_inputs] = inputs
+        for sources, weights, bias, response, columns, activations, aggregations in self._layers:
+            # einsum does not go through BLAS: the result of a row does not depend on the other rows of the batch
+            s = np.einsum('ij,jk->ik', values.take(sources, axis=1), weights)
+            for position, node_sources, node_weights, aggregation_function in aggregations:
+                s[:, position] = aggregation_function(values.take(node_sources, axis=1) * node_weights)
+            z = bias + response * s
+            for positions, activation_function in activations:
+                values[:, columns[positions]] = activation_function(z[:, positions])
+        return values[:, self._output_columns]
+
+    @staticmethod
+    def create(genome, config):
+        """
+        Receives a genome and returns its phenotype compiled in matrix form
+        :param genome: NEAT genome
+        :param config: NEAT config
+        :return: FeedForwardNetworkMine
+        """
+        genome_config = config.genome_config
+        # Gather expressed connections.
+        connections = [cg.key for cg in itervalues(genome.connections) if cg.enabled]
+        layers = feed_forward_layers(genome_config.input_keys, genome_config.output_keys, connections)
+
+        # inputs first, then outputs, then the hidden nodes in topological order
+        column_of = {}
+        for node in genome_config.input_keys + genome_config.output_keys:
+            column_of[node] = len(column_of)
+        for layer in layers:
+            for node in sorted(layer):
+                if node not in column_of:
+                    column_of[node] = len(column_of)
+
+        links = {}
+        for conn_key in connections:
+            inode, onode = conn_key
+            links.setdefault(onode, []).append((inode, genome.connections[conn_key].weight))
+
+        compiled_layers = []
+        for layer in layers:
+            nodes = sorted(layer)
+            sources = sorted(set(column_of[i] for node in nodes for i, w in links.get(node, [])))
+            row_of = dict((column, row) for row, column in enumerate(sources))
+            weights = np.zeros((len(sources), len(nodes)))
+            aggregations = []
+            activations = {}
+            for position, node in enumerate(nodes):
+                ng = genome.nodes[node]
+                if ng.aggregation == "sum":
+                    for i, w in links.get(node, []):
+                        weights[row_of[column_of[i]], position] += w
+                else:
+                    aggregation_function = AGGREGATIONS.get(ng.aggregation)
+                    if aggregation_function is None:
+                        aggregation_function = _row_wise(genome_config.aggregation_function_defs.get(ng.aggregation))
+                    node_links = links.get(node, [])
+                    aggregations.append((position, np.array([column_of[i] for i, w in node_links], dtype=np.int64),
+                                         np.array([w for i, w in node_links]), aggregation_function))
+                activations.setdefault(ng.activation, []).append(position)
+
+            activation_functions = []
+            for name, positions in activations.items():
+                activation_function = ACTIVATIONS.get(name)
+                if activation_function is None:
+                    activation_function = np.vectorize(genome_config.activation_defs.get(name), otypes=[float])
+                activation_functions.append((np.array(positions, dtype=np.int64), activation_function))
+
+            compiled_layers.append((np.array(sources, dtype=np.int64), weights,
+                                    np.array([genome.nodes[node].bias for node in nodes]),
+                                    np.array([genome.nodes[node].response for node in nodes]),
+                                    np.array([column_of[node] for node in nodes], dtype=np.int64),
+                                    activation_functions, aggregations))
+
+        return FeedForwardNetworkMine(number_of_nodes=len(column_of), number_of_inputs=len(genome_config.input_keys),
+                                      output_columns=np.array([column_of[node] for node in genome_config.output_keys],
+                                                              dtype=np.int64),
+                                      layers=compiled_layers)
+
+
+def _row_wise(aggregation_function):
+    """
+    Apply a custom aggregation function of neat-python row by row
+    :param aggregation_function: function receiving the list of weighted inputs of a node
+    :return: function receiving the matrix of weighted inputs
+    """
+    return lambda x: np.array([aggregation_function(row) for row in x.tolist()], dtype=float)
@@ -26,3 +26,8 @@ class NoveltyGenome(DefaultGenome):
         self.behaviour = None
         self.real_fitness = None
         self.novelty_score = None
+        # True if racing stopped the evaluation before all the trajectories
+        self.partial_evaluation = False
+        # attempts and seconds the workers needed to evaluate the genome
+        self.evaluation_attempts = 0
+        self.evaluation_seconds = 0.
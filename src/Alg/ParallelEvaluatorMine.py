@@ -15,11 +15,12 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import math
 
 import numpy as np
 from neat import ParallelEvaluator
 
-from src.Algorithms.support import compute_matrix_distances, get_novelty_score
+from src.Algorithms.support import compute_novelty_scores
 from src.Fitness.ValueGraphFitness import convert, MAX_TOTAL_FITNESS, MAX_FITNESS
 
 """
@@ -28,18 +29,208 @@ in order to evaluate multiple genomes at once.
 """
 from multiprocessing import Pool
 
+from src.Alg.TaskCoordinator import TaskCoordinator
+from src.Helpers.Trajectory import TrajectoryBatch
+
+# chunks of trajectories per worker in every generation, more chunks balance better the slow genomes
+CHUNKS_PER_WORKER = 4
+
+# what the workers send back for every genome: the fitness parts and the mean behaviour of its trajectories, partial
+# if racing stopped the genome before all its trajectories
+RESULT_DTYPE = np.dtype([("real_fitness", np.float64), ("behaviour", np.float64, (5,)), ("variance", np.float64),
+                         ("added_constraint", np.float64), ("value_direction", np.float64), ("partial", np.bool_)])
+
+
+def make_result(real_fitness, behaviour, variance, added_constraint, value_direction, partial=False):
+    """
+    Pack the evaluation of a genome in a RESULT_DTYPE record
+    :return: numpy record
+    """
+    result = np.zeros((), dtype=RESULT_DTYPE)
+    result["real_fitness"] = real_fitness
+    result["behaviour"] = behaviour
+    result["variance"] = variance
+    result["added_constraint"] = added_constraint
+    result["value_direction"] = value_direction
+    result["partial"] = partial
+    return result
+
+
+def _evaluate_chunk(task):
+    """
+    Generate a chunk of the trajectories of a genome in a worker
+    :param task: trajectory function, key of the genome, genome, generation, first and last (excluded) trajectory
+    :return: key of the genome, first trajectory and result of the trajectory function
+    """
+    trajectory_function, key, genome, generation, start, stop = task
+    return key, start, trajectory_function(genome, range(start, stop), generation=generation)
+
+
+def combine_chunks(chunks):
+    """
+    Combine the chunks of a genome back in the order of the trajectories
+    :param chunks: list of (first trajectory, (fitness, behaviours, directions, trajectories))
+    :return: fitness, behaviours, directions and trajectories of all the trajectories
+    """
+    chunks = [el[1] for el in sorted(chunks, key=lambda el: el[0])]
+    trajectories = [el[3] for el in chunks]
+    if any(el is None for el in trajectories):
+        trajectories = None
+    else:
+        trajectories = TrajectoryBatch.concatenate(trajectories)
+    return (np.vstack([el[0] for el in chunks]), np.vstack([el[1] for el in chunks]),
+            np.concatenate([el[2] for el in chunks]), trajectories)
+
 
 class ParallelEvaluatorMine(ParallelEvaluator):
-    def __init__(self, num_workers, eval_function, fitness_definition, timeout=None, k=15):
+    def __init__(self, num_workers, eval_function, fitness_definition, timeout=None, k=15, initializer=None,
+                 initargs=(), persistent_workers=False, cache=None, trajectory_function=None, reduce_function=None,
+                 number_of_trajectories=None, racing_stages=1, racing_percentile=50., max_trajectory_fitness=None,
+                 pool=None, max_attempts=3, logger=None, journal=None):
         """
-        eval_function should take one argument, a tuple of
-        (genome object, config object), and return
-        a single float (the genome's fitness).
+        eval_function should take the genome object and the generation, and return
+        a RESULT_DTYPE record and the data of the trajectories (None if not requested).
+        The config is given to the workers by the initializer.
+        initializer is run once with initargs by every worker when it starts.
+        With persistent_workers the workers live for the whole run, otherwise every genome gets a new process.
+        With an EvaluationCache the genomes already evaluated are not sent to the workers again.
+        With a trajectory_function the work is split in chunks of (genome, trajectories) instead of genomes:
+        trajectory_function(genome, indexes, generation=generation) generates the trajectories in the workers and
+        reduce_function(partial, generation=generation) combines all of them in the same result of eval_function.
+        With more than one racing stage the trajectories are generated in stages and after every stage the genomes
+        that cannot reach the racing_percentile of the real fitness of the previous generation, even if all their
+        remaining trajectories get max_trajectory_fitness, are stopped. Their result is the one of the trajectories
+        generated so far and it is flagged as partial.
+        A pool with the interface of multiprocessing.Pool, as RemotePool, can be given instead of the local one, its
+        workers run their initializer themselves.
+        The tasks are run by a TaskCoordinator: timeout is the deadline of every attempt, the failed, lost and
+        straggling tasks are sent again up to max_attempts times.
+        With an EvaluationJournal every evaluation is written as soon as it is completed and the genomes already in the
+        journal, evaluated before the run was interrupted, are not evaluated again.
         """
         super().__init__(num_workers, eval_function, timeout)
-        self.pool = Pool(processes=num_workers, maxtasksperchild=1)
+        if pool is not None:
+            # the pool of ParallelEvaluator is not used
+            self.pool.close()
+            self.pool = pool
+        else:
+            self.pool = Pool(processes=num_workers, initializer=initializer, initargs=initargs,
+                             maxtasksperchild=None if persistent_workers else 1)
         self._k = k
         self._fitness_definition = fitness_definition
+        self._cache = cache
+        self._journal = journal
+        self._num_workers = num_workers
+        self._trajectory_function = trajectory_function
+        self._reduce_function = reduce_function
+        self._number_of_trajectories = number_of_trajectories
+        self._racing_stages = racing_stages
+        self._racing_percentile = racing_percentile
+        self._max_trajectory_fitness = max_trajectory_fitness
+        # real fitness a genome has to be able to reach to not be stopped, None until a generation is evaluated
+        self._racing_threshold = None
+        self._coordinator = TaskCoordinator(pool=self.pool, num_workers=num_workers, deadline=timeout,
+                                            max_attempts=max_attempts, logger=logger)
+        # attempts and seconds of the evaluation of every genome of the current generation
+        self._statistics = {}
+
+    def _add_statistics(self, key, attempts, seconds):
+        """
+        Add the attempts and the time of a task of the genome, the attempts of the genome are the most attempts of one
+        of its tasks and its time is the time of all its tasks
+        """
+        previous_attempts, previous_seconds = self._statistics.get(key, (0, 0.))
+        self._statistics[key] = (max(previous_attempts, attempts), previous_seconds + seconds)
+
+    def _chunk_size(self, number_of_genomes, number_of_trajectories):
+        """
+        Number of trajectories in a chunk, such that every worker gets about CHUNKS_PER_WORKER chunks
+        :param number_of_genomes: genomes to evaluate
+        :param number_of_trajectories: trajectories to generate per genome
+        :return: int
+        """
+        total = number_of_genomes * number_of_trajectories
+        size = int(math.ceil(total / float(self._num_workers * CHUNKS_PER_WORKER)))
+        return max(1, min(number_of_trajectories, size))
+
+    def _run_chunks(self, to_evaluate, generation, first, last, chunks, on_genome=None):
+        """
+        Generate the trajectories from first to last (excluded) of the genomes in chunks, the chunks are collected as
+        soon as they are ready
+        :param to_evaluate: dictionary key -> genome
+        :param generation: current generation
+        :param first: first trajectory
+        :param last: last trajectory, excluded
+        :param chunks: dictionary key -> list of chunks where to add the new ones
+        :param on_genome: function called with the key of a genome as soon as all its chunks are ready
+        :return:
+        """
+        size = self._chunk_size(number_of_genomes=len(to_evaluate), number_of_trajectories=last - first)
+        tasks = {}
+        missing = {}
+        for key, genome in to_evaluate.items():
+            for start in range(first, last, size):
+                stop = min(start + size, last)
+                tasks[(key, start)] = (_evaluate_chunk,
+                                       ((self._trajectory_function, key, genome, generation, start, stop),), {})
+                missing[key] = missing.get(key, 0) + 1
+
+        def on_result(task_key, value):
+            key, start = task_key
+            chunks[key].append((start, value[2]))
+            missing[key] -= 1
+            if missing[key] == 0 and on_genome is not None:
+                on_genome(key)
+
+        ignored_values, statistics = self._coordinator.run(tasks=tasks, on_result=on_result)
+        for (key, start), value in statistics.items():
+            self._add_statistics(key, *value)
+
+    def _is_hopeless(self, chunks):
+        """
+        Check if a genome cannot reach the racing threshold anymore: its mean fitness is bounded assuming that all the
+        remaining trajectories get the max fitness
+        :param chunks: chunks of the genome generated so far
+        :return: True if the genome can be stopped
+        """
+        fitness = np.concatenate([el[1][0][:, 0] for el in chunks])
+        remaining = self._number_of_trajectories - fitness.shape[0]
+        bound = (np.sum(fitness) + remaining * self._max_trajectory_fitness) / self._number_of_trajectories
+        return bound < self._racing_threshold
+
+    def _evaluate_chunks(self, to_evaluate, generation):
+        """
+        Evaluate the genomes splitting their trajectories in chunks and combine them per genome.
+        When racing, the trajectories are generated in stages and the hopeless genomes are stopped after every stage
+        :param to_evaluate: dictionary key -> genome
+        :param generation: current generation
+        :return: dictionary key -> result of the reduce function, and set of the keys evaluated only partially
+        """
+        racing = self._racing_stages > 1 and self._racing_threshold is not None
+        stages = np.linspace(0, self._number_of_trajectories, self._racing_stages + 1 if racing else 2).astype(int)
+        chunks = {key: [] for key in to_evaluate}
+        live = dict(to_evaluate)
+        stopped = set()
+        evaluated = {}
+
+        def reduce_genome(key):
+            evaluated[key] = self._reduce_function(combine_chunks(chunks=chunks[key]), generation=generation)
+            evaluated[key][0]["partial"] = key in stopped
+            if self._journal is not None:
+                self._journal.append(genome=to_evaluate[key], generation=generation, result=evaluated[key][0])
+
+        for first, last in zip(stages[:-1], stages[1:]):
+            if last <= first or len(live) == 0:
+                continue
+            # in the last stage a genome is combined as soon as its chunks are ready
+            self._run_chunks(to_evaluate=live, generation=generation, first=first, last=last, chunks=chunks,
+                             on_genome=reduce_genome if last == self._number_of_trajectories else None)
+            if racing and last < self._number_of_trajectories:
+                for key in [key for key in live if self._is_hopeless(chunks=chunks[key])]:
+                    del live[key]
+                    stopped.add(key)
+                    reduce_genome(key)
+        return evaluated, stopped
 
     def evaluate(self, genomes, config):
         """
@@ -51,37 +242,65 @@ class ParallelEvaluatorMine(ParallelEvaluator):
         :return:
         """
         archive = config[1]
-        config = config[0]
-        jobs = []
-        for ignored_genome_id, genome in genomes:
-            jobs.append(self.pool.apply_async(self.eval_function, (genome, config)))
-
-        double_fitness = []
-        for job, (ignored_genome_id, genome) in zip(jobs, genomes):
-            double_fitness.append(job.get(timeout=self.timeout))
-
-        real_fitness = []
-        all_the_behaviours = []
-        variances = []
-        all_the_data_to_save = []
-        added_constraints = []
-        value_direction = []
-        for fit in double_fitness:
-            fit_result = fit
-            real_fitness.append(fit_result[0])
-            all_the_behaviours.append(fit_result[1])
-            variances.append(fit_result[2])
-            all_the_data_to_save.append(fit_result[5])
-            added_constraints.append(fit_result[3])
-            value_direction.append(fit_result[4])
-
-        total_fitness = []
-        total_fitness.extend(all_the_behaviours)
-        total_fitness.extend([archive[el] for el in range(len(archive))])
+        generation = config[2] if len(config) > 2 else None
+        keys = []
+        to_evaluate = {}
+        results = {}
+        for genome_id, genome in genomes:
+            key = genome_id if self._cache is None else self._cache.key(genome)
+            keys.append(key)
+            if key in to_evaluate or key in results:
+                continue
+            cached = None if self._cache is None else self._cache.get(key)
+            if cached is None and self._journal is not None:
+                cached = self._journal.get(genome=genome, generation=generation)
+            if cached is not None:
+                results[key] = cached
+            else:
+                to_evaluate[key] = genome
+
+        self._statistics = {}
+        if self._trajectory_function is None:
+            # the config is given to the workers once by the initializer
+            def on_result(key, result):
+                if self._journal is not None:
+                    self._journal.append(genome=to_evaluate[key], generation=generation, result=result[0])
+
+            evaluated, statistics = self._coordinator.run(
+                tasks={key: (self.eval_function, (genome,), {"generation": generation})
+                       for key, genome in to_evaluate.items()}, on_result=on_result)
+            for key, value in statistics.items():
+                self._add_statistics(key, *value)
+            stopped = set()
+        else:
+            evaluated, stopped = self._evaluate_chunks(to_evaluate=to_evaluate, generation=generation)
+        for key, result in evaluated.items():
+            results[key] = result
+            # a partial evaluation depends on the threshold of this generation, it is not reused
+            if self._cache is not None and key not in stopped:
+                self._cache.put(key, result)
+        results = [results[key] for key in keys]
+        records = np.stack([el[0] for el in results])
+        # the trajectories are sent back or stored only if requested
+        all_the_data_to_save = [el[1] for el in results]
+
+        real_fitness = records["real_fitness"].tolist()
+        partial = records["partial"].tolist()
+        if self._racing_stages > 1:
+            # the fitness of the stopped genomes is lower than their real one, so the threshold stays conservative
+            self._racing_threshold = float(np.percentile(records["real_fitness"], self._racing_percentile))
+        all_the_behaviours = [el.copy() for el in records["behaviour"]]
+        variances = records["variance"].tolist()
+        added_constraints = records["added_constraint"].tolist()
+        value_direction = records["value_direction"].tolist()
+
+        # the archive is already a matrix, no need to copy it in a list
+        total_fitness = np.array(all_the_behaviours, dtype=float)
+        if len(archive) > 0:
+            total_fitness = np.vstack([total_fitness, archive.behaviours()])
 
         # now what is returned is not a fitness, but a list of numpy vectors with behavioural information
-        distances = compute_matrix_distances(data_a=all_the_behaviours, data_b=total_fitness)
-        novelty_score = get_novelty_score(data=distances, k=self._k)
+        novelty_score = compute_novelty_scores(data_a=all_the_behaviours, data_b=total_fitness, k=self._k)
 
         real_fitness_converted = [convert(old_max=MAX_TOTAL_FITNESS, old_min=-300.,
                                           new_max=100, new_min=0, old_value=el if el > -300 else -300) for el in
@@ -101,9 +320,9 @@ class ParallelEvaluatorMine(ParallelEvaluator):
         elif self._fitness_definition == "force_length":
 
             median_length = []
-            for el in all_the_data_to_save:
-                all_values = [len(sub_el) for sub_el in el[2]]
-                median_value = np.mean(np.array(all_values))
+            # the mean length of the trajectories is the first element of the behaviour
+            for el in all_the_behaviours:
+                median_value = el[0]
                 median_length.append(convert(old_max=5000., old_min=0.0, new_max=100, new_min=1,
                                              old_value=median_value if median_value < 5000 else 5000))
 
@@ -112,9 +331,9 @@ class ParallelEvaluatorMine(ParallelEvaluator):
                 genome.fitness = value
         elif self._fitness_definition == "force_length_sum":
             median_length = []
-            for el in all_the_data_to_save:
-                all_values = [len(sub_el) for sub_el in el[2]]
-                median_value = np.mean(np.array(all_values))
+            # the mean length of the trajectories is the first element of the behaviour
+            for el in all_the_behaviours:
+                median_value = el[0]
                 median_length.append(convert(old_max=5000., old_min=0.0, new_max=100, new_min=1,
                                              old_value=median_value if median_value < 5000 else 5000))
 
@@ -259,6 +478,13 @@ class ParallelEvaluatorMine(ParallelEvaluator):
         for value, (ignored_genome_id, genome) in zip(value_direction, genomes):
             genome.value_direction = value
 
+        for value, (ignored_genome_id, genome) in zip(partial, genomes):
+            genome.partial_evaluation = value
+
+        # the genomes already evaluated in the cache took no attempts
+        for key, (ignored_genome_id, genome) in zip(keys, genomes):
+            genome.evaluation_attempts, genome.evaluation_seconds = self._statistics.get(key, (0, 0.))
+
 
 
 
@@ -0,0 +1,374 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import itertools
+import os
+import queue
+import socket
+import threading
+import time
+from multiprocessing import TimeoutError
+from multiprocessing.managers import BaseManager
+
+# environment variable with the key of the remote workers, so it does not appear in the command line
+AUTHKEY_VARIABLE = "TRAJECTORIESNEAT_AUTHKEY"
+
+
+class EvaluationManager(BaseManager):
+    """
+    Manager giving to the remote workers the queue of the tasks, the queue of the results and what to run when a
+    worker starts
+    """
+    pass
+
+
+EvaluationManager.register("get_tasks")
+EvaluationManager.register("get_results")
+EvaluationManager.register("get_setup")
+
+
+def parse_address(address):
+    """
+    From host:port to the address used by the managers
+    :param address: string host:port
+    :return: tuple (host, port)
+    """
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def get_authkey(authkey=None):
+    """
+    Key shared by the main process and the remote workers, given as argument or in the environment variable
+    AUTHKEY_VARIABLE.
+    The tasks and the results are pickled, whoever knows the key can run code on the main process and on the workers,
+    so there is no default key
+    :param authkey: key given as argument, None or empty to read the environment variable
+    :return: bytes
+    """
+    if not authkey:
+        authkey = os.environ.get(AUTHKEY_VARIABLE, "")
+    if not authkey:
+        raise ValueError("The remote workers need a key: use --remote_authkey or the environment variable "
+                         "{}".format(AUTHKEY_VARIABLE))
+    return authkey.encode("utf-8")
+
+
+class RemoteResult(object):
+    """
+    Result of a task sent to the remote workers, as the AsyncResult of multiprocessing.Pool
+    """
+
+    def __init__(self, pool, task_id):
+        self._pool = pool
+        self._task_id = task_id
+        self._consumed = False
+
+    def ready(self):
+        self._pool.poll()
+        return self._pool.is_done(task_id=self._task_id)
+
+    def started(self):
+        """
+        When a worker took the task, the time spent in the queue is not part of the attempt
+        :return: time.time() of the main process when the worker took the task, None if still in the queue
+        """
+        self._pool.poll()
+        return self._pool.started(task_id=self._task_id)
+
+    def get(self, timeout=None):
+        try:
+            value = self._pool.wait_for(task_ids=[self._task_id], timeout=timeout)[1]
+        except TimeoutError:
+            raise
+        except Exception:
+            self._consumed = True
+            raise
+        self._consumed = True
+        return value
+
+    def __del__(self):
+        # the result of a task nobody waits for anymore is not kept
+        if not self._consumed:
+            self._pool.forget(task_id=self._task_id)
+
+
+class RemoteIterator(object):
+    """
+    Results of many tasks sent to the remote workers in the order they are completed, as the iterator of
+    multiprocessing.Pool.imap_unordered
+    """
+
+    def __init__(self, pool, task_ids):
+        self._pool = pool
+        self._task_ids = set(task_ids)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next()
+
+    def next(self, timeout=None):
+        if len(self._task_ids) == 0:
+            raise StopIteration
+        task_id, result = self._pool.wait_for(task_ids=self._task_ids, timeout=timeout)
+        self._task_ids.remove(task_id)
+        return result
+
+
+class RemotePool(object):
+    """
+    Replacement of multiprocessing.Pool sending the tasks over TCP to workers that can run on other hosts.
+    The main process serves a task queue and a result queue with a manager, every worker started with run_worker
+    connects to it, runs the initializer once and then keeps taking tasks until the pool is closed.
+    The functions are sent by reference, the workers need the same code and data directory of the main process
+    """
+
+    def __init__(self, address, authkey, initializer=None, initargs=()):
+        """
+        :param address: (host, port) where to wait for the workers
+        :param authkey: bytes shared with the workers
+        :param initializer: function run by every worker when it connects
+        :param initargs: arguments of the initializer
+        """
+        self._tasks = queue.Queue()
+        self._results = queue.Queue()
+        self._setup = (initializer, initargs)
+        self._workers = 0
+        self._closed = False
+
+        class _Manager(BaseManager):
+            pass
+
+        _Manager.register("get_tasks", callable=lambda: self._tasks)
+        _Manager.register("get_results", callable=lambda: self._results)
+        _Manager.register("get_setup", callable=self._connect_worker)
+        # the server runs in a thread, the queues are shared with the main process without copies
+        self._server = _Manager(address=address, authkey=authkey).get_server()
+        self._server.stop_event = threading.Event()
+        self.address = self._server.address
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+        self._counter = itertools.count()
+        self._done = {}
+        self._forgotten = set()
+        # task id -> time when a worker took the task
+        self._started = {}
+
+    def _serve(self):
+        """
+        Accept the connections of the workers until the pool is stopped, every connection is served by its own thread.
+        Unlike serve_forever of the manager server, it stops accepting and closes the listening socket when stopped
+        """
+        while not self._server.stop_event.is_set():
+            try:
+                connection = self._server.listener.accept()
+            except Exception:
+                # failed authentication, or the connection that wakes up the accept when the pool is stopped
+                continue
+            threading.Thread(target=self._server.handle_request, args=(connection,), daemon=True).start()
+        self._server.listener.close()
+
+    def _stop(self):
+        """
+        Stop serving the workers and close the listening socket
+        """
+        if self._server.stop_event.is_set():
+            return
+        self._server.stop_event.set()
+        # the accept is blocking, a connection wakes it up
+        try:
+            socket.create_connection(self.address, timeout=1).close()
+        except OSError:
+            pass
+        self._thread.join()
+
+    def _connect_worker(self):
+        """
+        Called once by every worker when it connects
+        :return: initializer and its arguments
+        """
+        self._workers += 1
+        return self._setup
+
+    @property
+    def workers(self):
+        """
+        Number of workers connected so far, they can connect while the run goes on
+        """
+        return self._workers
+
+    def wait_for_workers(self, number=1, timeout=None):
+        """
+        Wait until enough workers are connected
+        :param number: workers to wait
+        :param timeout: seconds to wait, None to wait forever
+        :return:
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self._workers < number:
+            if deadline is not None and time.time() >= deadline:
+                raise TimeoutError()
+            time.sleep(0.1)
+
+    def _submit(self, function, arguments, keywords):
+        task_id = next(self._counter)
+        self._tasks.put((task_id, function, arguments, keywords))
+        return task_id
+
+    def apply_async(self, func, args=(), kwds=None):
+        """
+        Send a task to the workers
+        :return: RemoteResult
+        """
+        return RemoteResult(pool=self, task_id=self._submit(function=func, arguments=args, keywords=kwds or {}))
+
+    def imap_unordered(self, func, iterable):
+        """
+        Send a task for every element to the workers
+        :return: RemoteIterator
+        """
+        return RemoteIterator(pool=self, task_ids=[self._submit(function=func, arguments=(el,), keywords={})
+                                                   for el in iterable])
+
+    def _store(self, task_id, success, value):
+        if success is None:
+            # a worker took the task
+            if task_id not in self._forgotten:
+                self._started[task_id] = time.time()
+            return
+        started = self._started.pop(task_id, None)
+        if task_id in self._forgotten:
+            self._forgotten.remove(task_id)
+        else:
+            self._done[task_id] = (success, value, started)
+
+    def poll(self):
+        """
+        Collect the results already arrived, without waiting
+        """
+        while True:
+            try:
+                self._store(*self._results.get_nowait())
+            except queue.Empty:
+                return
+
+    def is_done(self, task_id):
+        return task_id in self._done
+
+    def started(self, task_id):
+        if task_id in self._done:
+            return self._done[task_id][2]
+        return self._started.get(task_id)
+
+    def forget(self, task_id):
+        """
+        Drop the result of a task, now or when it arrives
+        :param task_id: id of the task
+        """
+        if task_id in self._done:
+            del self._done[task_id]
+        else:
+            self._started.pop(task_id, None)
+            self._forgotten.add(task_id)
+
+    def wait_for(self, task_ids, timeout=None):
+        """
+        Wait until one of the tasks is completed
+        :param task_ids: ids of the tasks to wait
+        :param timeout: seconds to wait, None to wait forever
+        :return: id of the task completed and its result
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            for task_id in task_ids:
+                if task_id in self._done:
+                    success, value, _ = self._done.pop(task_id)
+                    if not success:
+                        raise RuntimeError("Remote task {} failed: {}".format(task_id, value))
+                    return task_id, value
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError()
+            try:
+                self._store(*self._results.get(timeout=remaining))
+            except queue.Empty:
+                raise TimeoutError()
+
+    def close(self):
+        """
+        Stop the workers once they finish the tasks already sent.
+        Closing again does nothing, ParallelEvaluator closes its pool also when it is deleted
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for _ in range(self._workers):
+            self._tasks.put(None)
+
+    def join(self, timeout=60):
+        """
+        Wait for the workers to take the stop and stop serving them
+        :param timeout: seconds to wait for the workers
+        """
+        deadline = time.time() + timeout
+        while not self._tasks.empty() and time.time() < deadline:
+            time.sleep(0.1)
+        self._stop()
+
+    def terminate(self):
+        self._stop()
+
+
+def run_worker(address, authkey):
+    """
+    Remote worker: connect to the RemotePool, run its initializer once, so the world stays loaded, and then evaluate
+    the tasks until the pool is closed
+    :param address: (host, port) of the RemotePool
+    :param authkey: bytes shared with the main process
+    :return:
+    """
+    manager = EvaluationManager(address=address, authkey=authkey)
+    manager.connect()
+    tasks = manager.get_tasks()
+    results = manager.get_results()
+    initializer, initargs = manager.get_setup()._getvalue()
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            task = tasks.get()
+            if task is None:
+                return
+        except (EOFError, OSError):
+            return
+        task_id, function, arguments, keywords = task
+        try:
+            # the main process starts the clock of the attempt now, not when the task was queued
+            results.put((task_id, None, None))
+        except (EOFError, OSError):
+            return
+        try:
+            message = (task_id, True, function(*arguments, **keywords))
+        except Exception as e:
+            message = (task_id, False, repr(e))
+        try:
+            results.put(message)
+        except (EOFError, OSError):
+            return
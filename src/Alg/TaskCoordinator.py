@@ -0,0 +1,171 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import collections
+import time
+from multiprocessing import TimeoutError
+
+import numpy as np
+
+# a task is a straggler when it runs STRAGGLER_FACTOR times longer than the median task, and at least
+# MIN_STRAGGLER_SECONDS
+STRAGGLER_FACTOR = 3.
+MIN_STRAGGLER_SECONDS = 5.
+POLL_SECONDS = 0.01
+# durations of the last tasks used for the median
+DURATIONS_WINDOW = 1000
+
+
+class TaskCoordinator(object):
+    """
+    Runs tasks on a pool keeping at most one task per worker in flight, so the time of every attempt is the time
+    spent by the worker.
+    A task that fails is sent again. A task running longer than the deadline is considered lost (the worker died or
+    hangs) and sent again. When there are no more tasks to start, the idle workers run a second copy of the
+    stragglers and the first copy to finish wins.
+    The deadline and the stragglers are measured from when a worker takes the task, if the pool tells it.
+    The copies that are given up, lost at the deadline or beaten by another copy, keep their worker busy until they
+    finish, so they count as tasks in flight until then. Only when all the workers are taken by given up copies one
+    task is sent anyway, as a dead worker never finishes its copy.
+    The evaluation of a task has to be deterministic, every attempt of a task gets the same arguments
+    """
+
+    def __init__(self, pool, num_workers, deadline=None, max_attempts=3, logger=None):
+        """
+        :param pool: pool with apply_async, whose results have ready and get, as multiprocessing.Pool and RemotePool
+        :param num_workers: workers of the pool, a RemotePool tells itself how many workers are connected
+        :param deadline: seconds after which an attempt is lost, None to never give up on an attempt
+        :param max_attempts: attempts of every task before failing
+        :param logger: logger
+        """
+        self._pool = pool
+        self._num_workers = num_workers
+        self._deadline = deadline
+        self._max_attempts = max_attempts
+        self._log = logger
+        self._durations = collections.deque(maxlen=DURATIONS_WINDOW)
+        # handles of the copies given up that can still be running on a worker, also after the run that sent them
+        self._abandoned = []
+
+    def _workers(self):
+        """
+        Workers that can run the tasks, the workers of a RemotePool can connect while the run goes on
+        :return: int
+        """
+        connected = getattr(self._pool, "workers", None)
+        return self._num_workers if connected is None else connected
+
+    @staticmethod
+    def _start(handle, sent):
+        """
+        Start of an attempt. A RemotePool tells when a worker took the task, the time in its queue is not part of the
+        attempt. The attempts sent to the other pools start when they are sent, there is a free worker for them
+        :param handle: result of apply_async
+        :param sent: time when the attempt was sent
+        :return: time, None if the attempt is still waiting for a worker
+        """
+        started = getattr(handle, "started", None)
+        return sent if started is None else started()
+
+    def _debug(self, message):
+        if self._log is not None:
+            self._log.debug(message)
+
+    def run(self, tasks, on_result=None):
+        """
+        Run all the tasks
+        :param tasks: dictionary key -> (function, arguments, keywords)
+        :param on_result: function called with key and result as soon as a task is completed
+        :return: dictionary key -> result and dictionary key -> (attempts, seconds of the attempt that finished)
+        """
+        pending = collections.deque(tasks.keys())
+        running = {}
+        attempts = {key: 0 for key in tasks}
+        results = {}
+        statistics = {}
+
+        def dispatch(key):
+            function, arguments, keywords = tasks[key]
+            attempts[key] += 1
+            running.setdefault(key, []).append((self._pool.apply_async(function, arguments, keywords), time.time()))
+
+        def retry(key, reason):
+            if attempts[key] >= self._max_attempts:
+                if isinstance(reason, TimeoutError):
+                    raise reason
+                raise RuntimeError("Task {} failed after {} attempts: {}".format(key, attempts[key], reason))
+            self._debug("Task {} sent again after attempt {}: {}".format(key, attempts[key], reason))
+            pending.appendleft(key)
+
+        while len(results) < len(tasks):
+            progress = False
+            now = time.time()
+            self._abandoned = [el for el in self._abandoned if not el.ready()]
+            for key in list(running.keys()):
+                for attempt in list(running[key]):
+                    handle, sent = attempt
+                    ready = handle.ready()
+                    start = self._start(handle=handle, sent=sent)
+                    if ready:
+                        running[key].remove(attempt)
+                        progress = True
+                        try:
+                            value = handle.get(0)
+                        except Exception as e:
+                            if len(running[key]) == 0:
+                                del running[key]
+                                retry(key=key, reason=e)
+                            continue
+                        start = sent if start is None else start
+                        results[key] = value
+                        statistics[key] = (attempts[key], now - start)
+                        if on_result is not None:
+                            on_result(key, value)
+                        self._durations.append(now - start)
+                        # the other copies still running are abandoned
+                        self._abandoned.extend(el[0] for el in running.pop(key))
+                        break
+                    elif self._deadline is not None and start is not None and now - start > self._deadline:
+                        running[key].remove(attempt)
+                        self._abandoned.append(handle)
+                        progress = True
+                        if len(running[key]) == 0:
+                            del running[key]
+                            retry(key=key, reason=TimeoutError("deadline of {} seconds".format(self._deadline)))
+
+            free = self._workers() - sum(len(el) for el in running.values()) - len(self._abandoned)
+            if free <= 0 and len(running) == 0 and len(pending) > 0:
+                free = 1
+            while free > 0 and len(pending) > 0:
+                dispatch(key=pending.popleft())
+                free -= 1
+                progress = True
+
+            if free > 0 and len(self._durations) > 0:
+                threshold = max(MIN_STRAGGLER_SECONDS, STRAGGLER_FACTOR * float(np.median(list(self._durations))))
+                starts = {key: self._start(handle=running[key][0][0], sent=running[key][0][1]) for key in running
+                          if len(running[key]) == 1 and attempts[key] < self._max_attempts}
+                stragglers = sorted([(start, key) for key, start in starts.items()
+                                     if start is not None and now - start > threshold], key=lambda el: el[0])
+                for _, key in stragglers[:free]:
+                    self._debug("Task {} is a straggler, running a second copy".format(key))
+                    dispatch(key=key)
+                    progress = True
+
+            if not progress:
+                time.sleep(POLL_SECONDS)
+        return results, statistics
@@ -16,6 +16,7 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import pickle
+from math import inf
 
 from neat import Population, CompleteExtinctionException
 from neat.six_util import iteritems, itervalues
@@ -34,10 +35,12 @@ class PopulationWithNovelty(Population):
     It adds support to novelty search on NEAT
     """
 
-    def __init__(self, config, prob_add, output_directory, initial_state=None):
+    def __init__(self, config, prob_add, output_directory, initial_state=None, archive_size=None, archive=None):
         super().__init__(config, initial_state)
 
-        self._archive = Archive(prob_add=prob_add)
+        if archive is None:
+            archive = Archive(maxsize=archive_size if archive_size else inf, prob_add=prob_add)
+        self._archive = archive
         self._output_directory = output_directory
         self._top_fitness = []
 
@@ -71,7 +74,7 @@ class PopulationWithNovelty(Population):
             self.reporters.start_generation(self.generation)
 
             # Evaluate all genomes using the user-provided function.
-            fitness_function(list(iteritems(self.population)), (self.config, self._archive))
+            fitness_function(list(iteritems(self.population)), (self.config, self._archive, self.generation))
 
             # Gather and report statistics.
             best = None
@@ -123,6 +126,10 @@ class PopulationWithNovelty(Population):
 
         return self.best_genome
 
+    @property
+    def archive(self):
+        return self._archive
+
     def get_population(self, fitness_function):
-        fitness_function(list(iteritems(self.population)), (self.config, self._archive))
+        fitness_function(list(iteritems(self.population)), (self.config, self._archive, self.generation))
         return self.population
@@ -16,6 +16,7 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import functools
 import json
 import multiprocessing
 import pickle
@@ -26,50 +27,95 @@ from joblib import Parallel, delayed
 import os
 import neat
 from src.Alg.CheckpointerMine import CheckpointerMine
+from src.Alg.EvaluationCache import EvaluationCache
+from src.Alg.EvaluationJournal import EvaluationJournal
 from src.Alg.GenomeMine import NoveltyGenome
-from src.Alg.ParallelEvaluatorMine import ParallelEvaluatorMine
+from src.Alg.ParallelEvaluatorMine import ParallelEvaluatorMine, make_result
+from src.Alg.RemotePool import RemotePool, get_authkey, parse_address
 from src.Alg.ReporterMine import MineReporter
 from src.Alg.population_mine import PopulationWithNovelty
 from src.Algorithms.winning_genome import worker_job_lib_winning_genome
 from src.Algorithms.winning_genome_attractions import worker_job_lib_behaviours
-from src.Fitness.GeneralFitness import compute_general_fitness, PRE_DEFINED_BEHAVIOURS_ALL
-from src.Helpers.APF import LoadAPF
-from src.Helpers.Division.ComputeDivision import SubMatrix
-from src.Helpers.GenomePhenome import GenomeMeaning
+from src.Alg.FeedForwardNetworkMine import FeedForwardNetworkMine
+from src.Fitness.FitnessGrid import FitnessGrid
+from src.Fitness.GeneralFitness import generate_trajectories, combine_general_fitness, PRE_DEFINED_BEHAVIOURS_ALL
+from src.Helpers.Funcs import random_streams
+from src.Helpers.TrajectoryStore import TrajectoryStore
+from src.Helpers.World import get_world, init_worker, publish_world
 
 from src.Settings.arguments import args
 
 
-def eval_genomes(genome, config):
+def eval_genomes(genome, config=None, generation=None):
     """
     Function that evaluates the genome
-    It loads the train points, it loads the precomputed distances and the fitness landscape definition
+    The train points, the precomputed distances, the fitness landscape definition and the NEAT config come from the
+    world of the current process
     It generates the trajectories and then it evaluates the fitness function
     :param genome: NEAT genome
-    :param config: NEAT config
-    :return: trajectories information, all the single fitness component and the final fitness function
+    :param config: NEAT config, None to use the one given to the worker
+    :param generation: current generation, where the trajectories are stored
+    :return: RESULT_DTYPE record with the fitness components and the behaviour, trajectories information only if
+             --keep_trajectories or --store_trajectories (with a TrajectoryHandle instead of the trajectories)
+    """
+    partial = eval_trajectories(genome=genome, indexes=range(args.numb_of_tra), config=config, generation=generation)
+    return reduce_trajectories(partial=partial, generation=generation, trajectory_store=get_world().trajectory_store)
+
+
+def eval_trajectories(genome, indexes, config=None, generation=None):
+    """
+    Generate and score some of the trajectories of the genome
+    :param genome: NEAT genome
+    :param indexes: indexes of the trajectories to generate, out of args.numb_of_tra
+    :param config: NEAT config, None to use the one given to the worker
+    :param generation: current generation, it defines the random choices of the trajectories
+    :return: result of generate_trajectories
     """
     number_of_tra_to_generate = args.numb_of_tra
 
-    loader_apf = LoadAPF(path="{}/the_right_one_fast".format(args.data_directory),
-                         logger=None)
-    loader_apf.load_apf_only_routing_system()
-    loader_apf.match_index_with_coordinates()
+    world = get_world()
+    if config is None:
+        config = world.config
 
-    real_tra_train = np.load("{}/real_tra_train_starting_points.npy".format(args.data_directory), allow_pickle=True)
+    net = FeedForwardNetworkMine.create(genome, config)
+    # the random choices of every trajectory do not depend on which worker generates it
+    streams = None
+    if generation is not None:
+        streams = random_streams(seed=args.seed, generation=generation, genome_key=genome.key,
+                                 number=number_of_tra_to_generate)
 
-    net = neat.nn.FeedForwardNetwork.create(genome, config)
+    return generate_trajectories(net=net, indexes=indexes, number_to_generate=number_of_tra_to_generate,
+                                 real_tra=world.real_tra_train, road_mask=world.road_mask,
+                                 sub_matrix=world.sub_matrix, fitness_landscape=world.fitness_landscape,
+                                 random_initial_point=args.random_point_start, point_distance=args.point_distance,
+                                 random_streams=streams)
 
-    loader_genome_meaning = GenomeMeaning(logger=None)
-    loader_genome_meaning.load_data()
 
-    sub_matrix = SubMatrix(log=None, apf=loader_apf.apf,
-                           list_points=loader_genome_meaning.name_typologies,
-                           values_matrix=(loader_apf.x_values, loader_apf.y_values))
-    sub_matrix.divide_into_cells()
+def eval_trajectory_chunk(genome, indexes, generation=None):
+    """
+    Chunk of the trajectories of a genome, evaluated by a worker and combined in the main process
+    The trajectories are sent back only if they are needed
+    :param genome: NEAT genome
+    :param indexes: indexes of the trajectories to generate
+    :param generation: current generation
+    :return: result of generate_trajectories
+    """
+    all_the_fitness, behaviours_generated, all_the_directions, all_tra_generated = \
+        eval_trajectories(genome=genome, indexes=indexes, generation=generation)
+    if not (args.penalty_behaviours or args.keep_trajectories or args.store_trajectories):
+        all_tra_generated = None
+    return all_the_fitness, behaviours_generated, all_the_directions, all_tra_generated
 
-    fitness_landscape = pickle.load(open("{}/3d_fitness_in_2d_with_limitation.pickle".format(args.data_directory), 'rb'))
 
+def reduce_trajectories(partial, generation=None, trajectory_store=None):
+    """
+    From the results of all the trajectories of a genome to the evaluation of the genome
+    :param partial: result of generate_trajectories for all the trajectories, in order
+    :param generation: current generation, where the trajectories are stored
+    :param trajectory_store: TrajectoryStore where to write the trajectories, None to not store them
+    :return: RESULT_DTYPE record and trajectories information, as eval_genomes
+    """
+    all_the_fitness, behaviours_generated, all_the_directions, all_tra_generated = partial
     # fitness_total = []
     # behaviour_total = []
     # variance_total = []
@@ -78,14 +124,10 @@ def eval_genomes(genome, config):
     # different_total_data_together = []
     # for _ in range(10):
     all_result_normal, all_results_behaviours, all_tra_generated, all_variance, average_converted_distance, \
-    single_fitness_data, all_the_directions = compute_general_fitness(net=net,
-                                                                      number_to_generate=number_of_tra_to_generate,
-                                                                      real_tra=real_tra_train,
-                                                                      apf=loader_apf.apf,
-                                                                      sub_matrix=sub_matrix,
-                                                                      fitness_landscape=fitness_landscape,
-                                                                      random_initial_point=args.random_point_start,
-                                                                      point_distance=args.point_distance,
+    single_fitness_data, all_the_directions = combine_general_fitness(all_the_fitness=all_the_fitness,
+                                                                      behaviours_generated=behaviours_generated,
+                                                                      all_the_directions=all_the_directions,
+                                                                      all_tra_generated=all_tra_generated,
                                                                       penalty_fitness=args.penalty_behaviours)
 
     all_result_normal_general = np.mean(np.array(all_result_normal))
@@ -116,8 +158,17 @@ def eval_genomes(genome, config):
     # single_direction_value = np.mean(np.array(direction_total))
     # average_converted_distance = np.mean(np.array(all_averaged_converted_distances))
 
-    return all_result_normal_general, all_result_behaviours_general, variance_general, average_converted_distance, \
-           single_direction_value, total_data_together
+    result = make_result(real_fitness=all_result_normal_general, behaviour=all_result_behaviours_general,
+                         variance=variance_general, added_constraint=average_converted_distance,
+                         value_direction=single_direction_value)
+    if not args.keep_trajectories:
+        if trajectory_store is not None and generation is not None:
+            handle = trajectory_store.write(generation=generation, trajectories=all_tra_generated)
+            total_data_together = (all_result_normal, all_results_behaviours, handle, all_variance,
+                                   average_converted_distance, single_fitness_data, all_the_directions)
+        else:
+            total_data_together = None
+    return result, total_data_together
 
 
 class neatAlgorithm(object):
@@ -134,29 +185,150 @@ class neatAlgorithm(object):
         self._output_directory = output
         self._fitness_definition = fitness_definition
         self._prob_add = prob_add
+        self._shared_world = None
+        self._checkpointer = None
 
     def initialise(self, frequency_checkpoints, restore_checkpoint_name=None):
         if restore_checkpoint_name is not None:
             self._population = CheckpointerMine.restore_checkpoint_with_novelty(filename=restore_checkpoint_name,
                                                                                 output_directory=self._output_directory,
-                                                                                prob_add=self._prob_add)
+                                                                                prob_add=self._prob_add,
+                                                                                archive_size=args.archive_size,
+                                                                                config=self._config)
         else:
             # Create the population, which is the top-level object for a NEAT run.
             self._population = PopulationWithNovelty(self._config, prob_add=self._prob_add,
-                                                     output_directory=self._output_directory)
+                                                     output_directory=self._output_directory,
+                                                     archive_size=args.archive_size)
 
         # Add a stdout reporter to show progress in the terminal.
         self._population.add_reporter(MineReporter(show_species_detail=True, logger=self._log, mlflow=self._mlflow))
         self._stats = neat.StatisticsReporter()
         self._population.add_reporter(self._stats)
-        self._population.add_reporter(CheckpointerMine(generation_interval=frequency_checkpoints,
-                                                       filename_prefix="{}/neat-checkpoint-".format(
-                                                           self._output_directory)))
+        self._checkpointer = CheckpointerMine(generation_interval=frequency_checkpoints,
+                                              filename_prefix="{}/neat-checkpoint-".format(self._output_directory),
+                                              archive=self._population.archive, compact=args.compact_checkpoints,
+                                              compresslevel=args.checkpoint_compression,
+                                              keep_last=args.keep_checkpoints,
+                                              reproduction=self._population.reproduction,
+                                              background=args.background_checkpoints, logger=self._log)
+        self._population.add_reporter(self._checkpointer)
+
+    def _get_shared_world(self):
+        """
+        Publish the world for the workers the first time it is needed
+        :return: SharedWorld
+        """
+        if self._shared_world is None:
+            directory = args.shared_directory if args.shared_directory != "" else self._output_directory
+            self._shared_world = publish_world(directory="{}/shared_world".format(directory), logger=self._log)
+        return self._shared_world
+
+    def _get_trajectory_store(self):
+        """
+        Store where the workers write the trajectories, if requested
+        :return: TrajectoryStore or None
+        """
+        if not args.store_trajectories:
+            return None
+        return TrajectoryStore(directory="{}/trajectories".format(self._output_directory))
+
+    @staticmethod
+    def _evaluation_settings():
+        """
+        Settings changing the trajectories, part of the key of the stored evaluations
+        :return: string
+        """
+        return repr((args.numb_of_tra, args.random_point_start, args.point_distance, args.penalty_behaviours,
+                     args.fitness_grid, args.keep_trajectories, args.store_trajectories))
+
+    def _get_evaluation_cache(self):
+        """
+        Cache of the evaluations, if requested
+        :return: EvaluationCache or None
+        """
+        if args.evaluation_cache <= 0:
+            return None
+        return EvaluationCache(maxsize=args.evaluation_cache, settings=self._evaluation_settings())
+
+    def _get_evaluation_journal(self):
+        """
+        Journal of the evaluations in the output directory, if requested. Restoring a run with the same output
+        directory the genomes already in the journal are not evaluated again
+        :return: EvaluationJournal or None
+        """
+        if not args.evaluation_journal:
+            return None
+        journal = EvaluationJournal(path="{}/evaluation_journal.dat".format(self._output_directory), seed=args.seed,
+                                    settings=repr((self._evaluation_settings(), args.racing_stages,
+                                                   args.racing_percentile)))
+        self._log.info("Evaluation journal with {} evaluations".format(len(journal)))
+        return journal
+
+    def _get_remote_pool(self):
+        """
+        Pool of the remote workers, if requested
+        The remote workers load the world from their own data directory and the main process writes the trajectories
+        :return: RemotePool or None
+        """
+        if args.remote_address == "":
+            return None
+        pool = RemotePool(address=parse_address(args.remote_address), authkey=get_authkey(args.remote_authkey),
+                          initializer=init_worker, initargs=(None, self._config, None))
+        self._log.info("Waiting for the remote workers on {}".format(args.remote_address))
+        # the tasks sent before a worker is connected would only wait in the queue
+        pool.wait_for_workers(number=1)
+        self._log.info("{} remote workers connected".format(pool.workers))
+        return pool
+
+    @staticmethod
+    def _get_max_trajectory_fitness():
+        """
+        Highest fitness a single trajectory can obtain on the fitness landscape, bound used by the racing
+        :return: float value
+        """
+        with open("{}/3d_fitness_in_2d_with_limitation.pickle".format(args.data_directory), 'rb') as handle:
+            fitness_landscape = pickle.load(handle)
+        point_distance = [] if args.point_distance is None else args.point_distance
+        return FitnessGrid(fitness_landscape=fitness_landscape).max_fitness_value(point_distance=point_distance)
 
     def run(self, generations):
-        pe = ParallelEvaluatorMine(num_workers=multiprocessing.cpu_count(), eval_function=eval_genomes,
-                                   fitness_definition=self._fitness_definition)
-        winner = self._population.run(pe.evaluate, generations)
+        trajectory_store = self._get_trajectory_store()
+        pool = self._get_remote_pool()
+        chunked = args.trajectory_chunks or args.racing_stages > 1 or pool is not None
+        chunks = {}
+        if chunked:
+            # the trajectories of a genome come from different workers, the main process writes them
+            chunks = {"trajectory_function": eval_trajectory_chunk, "number_of_trajectories": args.numb_of_tra,
+                      "reduce_function": functools.partial(reduce_trajectories, trajectory_store=trajectory_store)}
+        if args.racing_stages > 1:
+            chunks.update({"racing_stages": args.racing_stages, "racing_percentile": args.racing_percentile,
+                           "max_trajectory_fitness": self._get_max_trajectory_fitness()})
+        journal = self._get_evaluation_journal()
+        num_workers = multiprocessing.cpu_count()
+        if pool is not None:
+            # the workers in flight follow the workers connected, the chunks are sized for the expected ones
+            num_workers = args.remote_workers if args.remote_workers > 0 else pool.workers
+        pe = ParallelEvaluatorMine(num_workers=num_workers, eval_function=eval_genomes,
+                                   fitness_definition=self._fitness_definition, initializer=init_worker,
+                                   initargs=(self._get_shared_world(), self._config, trajectory_store),
+                                   persistent_workers=args.persistent_workers or chunked,
+                                   cache=self._get_evaluation_cache(), pool=pool,
+                                   timeout=args.task_deadline if args.task_deadline > 0 else None,
+                                   max_attempts=args.task_attempts, logger=self._log,
+                                   journal=journal, **chunks)
+        try:
+            winner = self._population.run(pe.evaluate, generations)
+        finally:
+            # the checkpoints written in background are completed
+            if self._checkpointer is not None:
+                self._checkpointer.close()
+            if journal is not None:
+                journal.close()
+            # the remote workers are stopped and the main process stops listening for them
+            if pool is not None:
+                pool.close()
+                pool.join()
         # Display the winning genome.
         self._log.info('\nBest genome:\n{!s}'.format(winner))
 
@@ -181,7 +353,8 @@ class neatAlgorithm(object):
 
     def generate_trajectories_from_checkpoint(self, number_of_trajectories_to_generate):
         pe = ParallelEvaluatorMine(num_workers=2, eval_function=eval_genomes,
-                                   fitness_definition=self._fitness_definition)
+                                   fitness_definition=self._fitness_definition, initializer=init_worker,
+                                   initargs=(self._get_shared_world(), self._config, self._get_trajectory_store()))
         self._log.info("Re-evalaute again population")
 
         pop = self._population.get_population(pe.evaluate)
@@ -233,7 +406,8 @@ class neatAlgorithm(object):
             cores = 1
         with Parallel(n_jobs=cores, verbose=30) as parallel:
             res = parallel(delayed(worker_job_lib_winning_genome)(starting_point_train[i], individual, self._config,
-                                                   args.point_distance) for i in range(trajectories_to_generate))
+                                                                  args.point_distance, self._get_shared_world())
+                           for i in range(trajectories_to_generate))
 
         if output_dir is None:
             output_dir = self._output_directory
@@ -270,6 +444,7 @@ class neatAlgorithm(object):
 
         with Parallel(n_jobs=cores, verbose=30) as parallel:
             res = parallel(delayed(worker_job_lib_behaviours)(starting_point_train, individual, self._config,
-                                                              args.point_distance, permutations[i], output_dir, name, i)
+                                                              args.point_distance, permutations[i], output_dir, name, i,
+                                                              self._get_shared_world())
                            for i in
                            range(len(permutations)))
@@ -16,10 +16,10 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import random
-from copy import deepcopy
 from math import inf
 
 import numpy as np
+from scipy.spatial import cKDTree
 
 
 class Archive(object):
@@ -27,11 +27,14 @@ class Archive(object):
     The insertion is ordered following the generation of the evolution.
 
     A single copy of each individual is kept at all time.
+    The behaviours are stored as rows of a preallocated numpy buffer.
+    With a fixed maxsize the buffer is a ring where every behaviour is written twice (position i and i + maxsize),
+    so the behaviours from the oldest to the newest are always a contiguous slice of it.
+    Without maxsize the buffer doubles its size when full.
 
     :param maxsize: The maximum number of individual to keep in the Archive.
                     It default value is infinite
-    :param similar: An equivalence operator between two individuals, optional.
-                    It defaults to operator :func:`operator.eq`.
+    :param prob_add: probability to add the best individual of the generation
 
     The class :class:`Archive` provides an interface similar to a list
     (without being one completely). It is possible to retrieve its length, to
@@ -40,9 +43,10 @@ class Archive(object):
 
     def __init__(self, maxsize=inf, prob_add=0.1):
         self._maxsize = maxsize
-        self._keys = list()
-        self._items = list()
         self._prob_add = prob_add
+        self._buffer = None
+        self._start = 0
+        self._size = 0
 
     def update(self, population):
         """Update the Archive with the *population* by erasing the
@@ -69,68 +73,158 @@ class Archive(object):
 
         if v < self._prob_add:
             self.insert(current_ind.behaviour)
-            if len(self) > self._maxsize:
-                self.remove(0)
+
+    def _allocate(self, width):
+        if self._maxsize != inf:
+            self._buffer = np.zeros((2 * int(self._maxsize), width))
+        else:
+            self._buffer = np.zeros((16, width))
 
     def insert(self, item):
         """Insert a new individual in the archive  Inserting a new
         individual in the hall of fame also preserve the hall of fame's order.
-        This method **does not** check for the size of the hall of fame, in a
-        way that inserting a new individual in a full hall of fame will not
-        remove the worst individual to maintain a constant size.
+        If the archive is full the oldest individual is removed.
 
-        :param item: The individual with a fitness attribute to insert in the
-                     hall of fame.
+        :param item: The behaviour of the individual to insert in the archive.
         """
-        item = deepcopy(item)
-        self._items.append(item)
-        self._keys.append(item)
+        item = np.ravel(item)
+        if self._buffer is None:
+            self._allocate(width=item.shape[0])
+        if self._maxsize != inf:
+            if self._maxsize <= 0:
+                return
+            capacity = int(self._maxsize)
+            position = (self._start + self._size) % capacity
+            self._buffer[position] = item
+            self._buffer[position + capacity] = item
+            if self._size == capacity:
+                self._start = (self._start + 1) % capacity
+            else:
+                self._size += 1
+        else:
+            if self._size == self._buffer.shape[0]:
+                self._buffer = np.concatenate([self._buffer, np.zeros_like(self._buffer)])
+            self._buffer[self._size] = item
+            self._size += 1
 
     def remove(self, index):
         """Remove the specified *index* from the Archive.
 
         :param index: An integer giving which item to remove.
         """
-        del self._keys[index]
-        del self._items[index]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("archive index out of range")
+        if index == 0 and self._maxsize != inf:
+            self._start = (self._start + 1) % int(self._maxsize)
+            self._size -= 1
+            return
+        behaviours = np.delete(self.behaviours(), index, axis=0)
+        self.clear()
+        for el in behaviours:
+            self.insert(el)
 
     def clear(self):
         """Clear the archive."""
-        del self._items[:]
-        del self._keys[:]
+        self._start = 0
+        self._size = 0
+
+    def behaviours(self):
+        """
+        Behaviours in the archive, from the oldest to the newest
+        :return: view of the buffer (number of behaviours, size of the behaviour)
+        """
+        if self._buffer is None:
+            return np.zeros((0, 0))
+        return self._buffer[self._start:self._start + self._size]
 
     def __len__(self):
-        return len(self._items)
+        return self._size
 
     def __getitem__(self, i):
-        return self._items[i]
+        return self.behaviours()[i]
 
     def __iter__(self):
-        return iter(self._items)
+        return iter(self.behaviours())
 
     def __reversed__(self):
-        return reversed(self._items)
+        return iter(self.behaviours()[::-1])
 
     def __str__(self):
-        return str(self._items)
+        return str(self.behaviours())
+
+    def __getstate__(self):
+        # only the behaviours in the archive, not the whole buffer
+        return {"maxsize": self._maxsize, "prob_add": self._prob_add, "behaviours": self.behaviours().copy()}
+
+    def __setstate__(self, state):
+        self.__init__(maxsize=state["maxsize"], prob_add=state["prob_add"])
+        for el in state["behaviours"]:
+            self.insert(el)
+
+
+# above this number of behaviours to compare with, the neighbours are found with a k-d tree
+KDTREE_THRESHOLD = 5000
+
+
+def _first_elements(data):
+    """
+    Matrix with the first element of every behaviour, the only part used for the novelty
+    :param data: list of behaviours or matrix with a behaviour per row
+    :return: matrix (number of behaviours, size of the first element)
+    """
+    if isinstance(data, np.ndarray) and data.ndim == 2:
+        return np.array(data[:, :1], dtype=float)
+    return np.array([np.ravel(el[0]) for el in data], dtype=float).reshape((len(data), -1))
 
 
-def compute_matrix_distances(data_a, data_b):
-    matrix = np.zeros((len(data_a), len(data_b)))
-    for i in range(len(data_a)):
-        for j in range(len(data_b)):
-            vector_a = data_a[i][0]
-            vector_b = data_b[j][0]
-            matrix[i, j] = np.sqrt(np.sum((vector_a - vector_b) ** 2))
+def compute_matrix_distances(data_a, data_b, chunk=1024):
+    """
+    Euclidean distance between the first element of every behaviour in data_a and of every behaviour in data_b
+    :param data_a: behaviours of the population
+    :param data_b: behaviours to compare with (population and archive)
+    :param chunk: number of rows computed together, to limit the memory
+    :return: distance matrix (len(data_a), len(data_b))
+    """
+    vectors_a = _first_elements(data=data_a)
+    vectors_b = _first_elements(data=data_b)
+    matrix = np.zeros((vectors_a.shape[0], vectors_b.shape[0]))
+    for start in range(0, vectors_a.shape[0], chunk):
+        difference = vectors_a[start:start + chunk, np.newaxis, :] - vectors_b[np.newaxis, :, :]
+        matrix[start:start + chunk] = np.sqrt(np.sum(difference ** 2, axis=2))
     return matrix
 
 
 def get_novelty_score(data, k):
+    """
+    Novelty of every row of the distance matrix: mean distance to its k nearest behaviours
+    :param data: distance matrix
+    :param k: number of neighbours
+    :return: list of novelty scores
+    """
     if k > data.shape[0]:
         k = data.shape[0] - 1
-    values = []
-    for i in range(data.shape[0]):
-        vector = data[i]
-        idx = np.argpartition(vector, k)
-        values.append(float(np.mean(vector[idx[:k]])))
-    return values
+    nearest = np.partition(data, k, axis=1)[:, :k]
+    return [float(el) for el in np.mean(nearest, axis=1)]
+
+
+def compute_novelty_scores(data_a, data_b, k, kdtree_threshold=KDTREE_THRESHOLD):
+    """
+    Novelty of every behaviour of data_a compared with the behaviours of data_b
+    With few behaviours the full distance matrix is computed, otherwise only the k nearest neighbours are searched
+    with a k-d tree. The scores are the same
+    :param data_a: behaviours of the population
+    :param data_b: behaviours to compare with (population and archive)
+    :param k: number of neighbours
+    :param kdtree_threshold: number of behaviours in data_b from which the k-d tree is used
+    :return: list of novelty scores
+    """
+    if len(data_b) < kdtree_threshold or len(data_a) < 2:
+        return get_novelty_score(data=compute_matrix_distances(data_a=data_a, data_b=data_b), k=k)
+    if k > len(data_a):
+        k = len(data_a) - 1
+    tree = cKDTree(_first_elements(data=data_b))
+    nearest, _ = tree.query(_first_elements(data=data_a), k=k)
+    nearest = np.reshape(nearest, (len(data_a), k))
+    return [float(el) for el in np.mean(nearest, axis=1)]
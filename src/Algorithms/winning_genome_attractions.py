@@ -17,43 +17,29 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import pickle
 
-import neat
-
+from src.Alg.FeedForwardNetworkMine import FeedForwardNetworkMine
 from src.Fitness.GeneralFitness import compute_general_fitness
-from src.Helpers.APF import LoadAPF
-from src.Helpers.Division.ComputeDivision import SubMatrix
-from src.Helpers.GenomePhenome import GenomeMeaning
+from src.Helpers.World import get_world
 from src.Settings.arguments import args
 
 """
 Multiprocessing function to generate trajectories conditioned from different behaviours
 """
-def worker_job_lib_behaviours(starting_point, genome, config, point_distance, multipliers, output_dir, name, i):
-    loader_apf = LoadAPF(path="{}/the_right_one_fast".format(args.data_directory),
-                         logger=None)
-    loader_apf.load_apf_only_routing_system()
-    loader_apf.match_index_with_coordinates()
-
-    net = neat.nn.FeedForwardNetwork.create(genome, config)
-
-    loader_genome_meaning = GenomeMeaning(logger=None)
-    loader_genome_meaning.load_data()
+def worker_job_lib_behaviours(starting_point, genome, config, point_distance, multipliers, output_dir, name, i,
+                              shared_world=None):
+    world = get_world(shared=shared_world)
 
-    sub_matrix = SubMatrix(log=None, apf=loader_apf.apf,
-                           list_points=loader_genome_meaning.name_typologies,
-                           values_matrix=(loader_apf.x_values, loader_apf.y_values))
-    sub_matrix.divide_into_cells()
+    net = FeedForwardNetworkMine.create(genome, config)
 
     starting_point = starting_point[:50]
 
-    fitness_landscape = pickle.load(open("{}/3d_fitness_in_2d_with_limitation.pickle".format(args.data_directory), 'rb'))
     all_result_normal, all_results_behaviours, all_tra_generated, all_variance, average_converted_distance, \
     single_fitness_data, all_the_directions = compute_general_fitness(net=net,
                                                                       number_to_generate=len(starting_point),
                                                                       real_tra=starting_point,
-                                                                      apf=loader_apf.apf,
-                                                                      sub_matrix=sub_matrix,
-                                                                      fitness_landscape=fitness_landscape,
+                                                                      road_mask=world.road_mask,
+                                                                      sub_matrix=world.sub_matrix,
+                                                                      fitness_landscape=world.fitness_landscape,
                                                                       random_initial_point=False,
                                                                       point_distance=point_distance,
                                                                       penalty_fitness=args.penalty_behaviours,
@@ -27,6 +27,7 @@ import seaborn as sns
 
 from src.Helpers.APF import LoadAPF
 from src.Helpers.Funcs import sorted_nicely
+from src.Helpers.Trajectory import to_coordinates
 
 if __name__ == '__main__':
     logger = logging.getLogger("LoadTrajectories")
@@ -66,13 +67,10 @@ if __name__ == '__main__':
             all_trajectories = content[1][2]
             tra_idx = 0
             for tra in all_trajectories:
-                x = []
-                y = []
-                combinations = {}
-                for points in tra:
-                    x.append(int(points.x))
-                    y.append(int(points.y))
-                    combinations["{}-{}".format(int(points.x), int(points.y))] = 1
+                coordinates = to_coordinates(trajectory=tra).astype(int)
+                x = coordinates[:, 0].tolist()
+                y = coordinates[:, 1].tolist()
+                combinations = {"{}-{}".format(px, py): 1 for px, py in zip(x, y)}
                 max_x = max(x) + 1
                 min_x = min(x) - 1
                 max_y = max(y) + 1
@@ -29,6 +29,7 @@ from tqdm import trange
 from src.Fitness.GeneralFitness import compute_direction
 from src.Fitness.ValueGraphFitness import convert, MAX_FITNESS
 from src.Helpers.Funcs import sorted_nicely
+from src.Helpers.Trajectory import to_coordinates
 
 
 class NEATFitnessAnalyser(object):
@@ -65,9 +66,9 @@ class NEATFitnessAnalyser(object):
             # get more info from the trajectories generated
             values_of_same_elements = []
             for ii in range(len(current_analysed)):
-                first_tra = [[int(p.x), int(p.y)] for p in current_analysed[ii]]
+                first_tra = to_coordinates(trajectory=current_analysed[ii]).tolist()
                 for j in range(ii + 1, len(current_analysed)):
-                    second_tra = [[int(p.x), int(p.y)] for p in current_analysed[j]]
+                    second_tra = to_coordinates(trajectory=current_analysed[j]).tolist()
                     tot = [*first_tra, *second_tra]
 
                     equality = pd.DataFrame(np.array(tot).T).T.drop_duplicates(keep=False).values.shape[0] / len(
@@ -0,0 +1,233 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+
+import numpy as np
+from shapely.geometry import Point
+from shapely.prepared import prep
+
+from src.Fitness.ValueGraphFitness import convert, MAX_FITNESS, LIMIT_TIMESTEPS
+
+# (external hull, internal hull, internal hull with the centroid) of the three pairs of features
+# curliness - length, curliness - further distance, further distance - length
+LANDSCAPE_PAIRS = [(0, 1, 6), (2, 3, 8), (4, 5, 10)]
+# range and step of the grid for every feature, curliness is multiplied by 100
+CURLINESS_AXIS = (0.0, 150.0, 0.25)
+LENGTH_AXIS = (0.0, LIMIT_TIMESTEPS + 5.0, 5.0)
+DISTANCE_AXIS = (0.0, LIMIT_TIMESTEPS + 5.0, 5.0)
+GRID_AXES = [(CURLINESS_AXIS, LENGTH_AXIS), (CURLINESS_AXIS, DISTANCE_AXIS), (DISTANCE_AXIS, LENGTH_AXIS)]
+
+
+class FitnessGrid(object):
+    """
+    Fitness landscape ready to score many trajectories at once.
+    The hulls are prepared and their centroids computed only once.
+    Optionally the distance from the borders of the hulls of every pair of features is precomputed on a grid and read
+    with a bilinear interpolation, the signed distance of the fitness is then rebuilt from it.
+    Points outside the grid are evaluated exactly.
+    It can still be indexed as the list of hulls it is built from
+    """
+
+    def __init__(self, fitness_landscape, grid_path=None, logger=None, grids=None):
+        """
+        :param fitness_landscape: list of hulls loaded from the pickle
+        :param grid_path: file where to read (or write once computed) the grids, None to always evaluate exactly
+        :param logger: logger
+        :param grids: grids already computed, as the ones shared by the main process, instead of grid_path
+        """
+        self._log = logger
+        self._landscape = fitness_landscape
+        self._prepared = [prep(el) for el in fitness_landscape]
+        self._centroids = [(el.centroid.x, el.centroid.y) for el in fitness_landscape]
+        self._grids = grids
+        if grids is None and grid_path is not None:
+            self._load_or_build_grids(path=grid_path)
+
+    @property
+    def grids(self):
+        """
+        Grids of the pairs of features, None if the fitness is always evaluated exactly
+        """
+        return self._grids
+
+    def __getitem__(self, item):
+        return self._landscape[item]
+
+    def __len__(self):
+        return len(self._landscape)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # prepared geometries cannot be pickled
+        del state["_prepared"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._prepared = [prep(el) for el in self._landscape]
+
+    def _load_or_build_grids(self, path):
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self._grids = [data["pair_{}".format(i)] for i in range(len(LANDSCAPE_PAIRS))]
+            if self._log is not None:
+                self._log.debug("Fitness grid loaded from {}".format(path))
+            return
+        if self._log is not None:
+            self._log.info("Computing the fitness grid, it is done only once")
+        grids = []
+        for pair in range(len(LANDSCAPE_PAIRS)):
+            (x_min, x_max, x_step), (y_min, y_max, y_step) = GRID_AXES[pair]
+            xs, ys = np.meshgrid(np.arange(x_min, x_max + x_step / 2, x_step),
+                                 np.arange(y_min, y_max + y_step / 2, y_step), indexing="ij")
+            external, internal, _ = LANDSCAPE_PAIRS[pair]
+            grids.append(np.stack([self._boundary_distances(index=external, xs=xs.ravel(), ys=ys.ravel()),
+                                   self._boundary_distances(index=internal, xs=xs.ravel(), ys=ys.ravel())],
+                                  axis=-1).reshape(xs.shape + (2,)))
+        self._grids = grids
+        temporary_path = "{}.{}.tmp.npz".format(path, os.getpid())
+        try:
+            np.savez_compressed(temporary_path, **{"pair_{}".format(i): el for i, el in enumerate(grids)})
+            os.replace(temporary_path, path)
+        except OSError:
+            pass
+
+    def _boundary_distances(self, index, xs, ys):
+        """
+        Distance of the points from the border of the hull, negative inside the hull.
+        Differently from the signed distance of the fitness it is continuous, so it can be interpolated
+        :param index: index of the hull
+        :param xs: first feature
+        :param ys: second feature
+        :return: vector of distances
+        """
+        boundary = self._landscape[index].boundary
+        distances = np.zeros(xs.shape[0])
+        for i in range(xs.shape[0]):
+            point = Point(xs[i], ys[i])
+            distances[i] = point.distance(boundary)
+            if self._prepared[index].contains(point):
+                distances[i] = -distances[i]
+        return distances
+
+    def _exact_signed_distances(self, pair, xs, ys):
+        """
+        Signed distance of the points from the hulls of the pair, as _get_fitness_length_curliness
+        :param pair: index of the pair of features
+        :param xs: first feature
+        :param ys: second feature
+        :return: vector of distances
+        """
+        external, internal, _ = LANDSCAPE_PAIRS[pair]
+        distances = np.zeros(xs.shape[0])
+        for i in range(xs.shape[0]):
+            point = Point(xs[i], ys[i])
+            if self._prepared[internal].contains(point):
+                distances[i] = 0
+            elif self._prepared[external].contains(point):
+                distances[i] = point.distance(self._landscape[internal])
+            else:
+                distances[i] = -point.distance(self._landscape[external])
+        return distances
+
+    def _signed_distances(self, pair, xs, ys):
+        """
+        Signed distance of the points from the hulls of the pair, interpolated from the grid when available
+        :param pair: index of the pair of features
+        :param xs: first feature
+        :param ys: second feature
+        :return: vector of distances and boolean vector of the points inside the internal hull
+        """
+        if self._grids is None:
+            distances = self._exact_signed_distances(pair=pair, xs=xs, ys=ys)
+            return distances, distances == 0
+        grid = self._grids[pair]
+        (x_min, _, x_step), (y_min, _, y_step) = GRID_AXES[pair]
+        fx = (xs - x_min) / x_step
+        fy = (ys - y_min) / y_step
+        in_grid = (fx >= 0) & (fx <= grid.shape[0] - 1) & (fy >= 0) & (fy <= grid.shape[1] - 1)
+        i = np.clip(np.floor(fx), 0, grid.shape[0] - 2).astype(np.int64)
+        j = np.clip(np.floor(fy), 0, grid.shape[1] - 2).astype(np.int64)
+        tx = np.clip(fx - i, 0.0, 1.0)[:, np.newaxis]
+        ty = np.clip(fy - j, 0.0, 1.0)[:, np.newaxis]
+        boundary_distances = grid[i, j] * (1 - tx) * (1 - ty) + grid[i + 1, j] * tx * (1 - ty) + \
+                             grid[i, j + 1] * (1 - tx) * ty + grid[i + 1, j + 1] * tx * ty
+        to_external, to_internal = boundary_distances[:, 0], boundary_distances[:, 1]
+        inside = to_internal <= 0
+        distances = np.where(inside, 0.0, np.where(to_external <= 0, to_internal, -to_external))
+        outside_grid = np.flatnonzero(~in_grid)
+        if outside_grid.shape[0] > 0:
+            distances[outside_grid] = self._exact_signed_distances(pair=pair, xs=xs[outside_grid],
+                                                                   ys=ys[outside_grid])
+            inside[outside_grid] = distances[outside_grid] == 0
+        return distances, inside
+
+    def _pair_fitness(self, pair, xs, ys, point_distance):
+        """
+        Fitness of one pair of features, as the _get_combination_two_fitness functions
+        """
+        distances, inside = self._signed_distances(pair=pair, xs=xs, ys=ys)
+        if pair not in point_distance:
+            return convert(old_max=0, old_min=-150, new_max=MAX_FITNESS, new_min=-300, old_value=distances)
+        centroid_x, centroid_y = self._centroids[LANDSCAPE_PAIRS[pair][2]]
+        distances_to_center = np.maximum(-np.sqrt((xs - centroid_x) ** 2 + (ys - centroid_y) ** 2), -5000)
+        return np.where(inside,
+                        convert(old_max=0, old_min=-5000, new_max=MAX_FITNESS, new_min=100,
+                                old_value=distances_to_center),
+                        convert(old_max=0, old_min=-150, new_max=100, new_min=-300, old_value=distances))
+
+    def get_fitness_values(self, lengths, curliness, further_distances, point_distance):
+        """
+        Vectorised get_fitness_value for many trajectories
+        :param lengths: lengths of the trajectories
+        :param curliness: curliness of the trajectories
+        :param further_distances: further distance to the start of the trajectories
+        :param point_distance: modification to the fitness function
+        :return: total fitness and fitness of the pairs distance - length, curliness - length, curliness - distance
+        """
+        lengths = np.asarray(lengths, dtype=float)
+        curliness = np.asarray(curliness, dtype=float) * 100
+        further_distances = np.asarray(further_distances, dtype=float)
+        value_from_curliness_length = self._pair_fitness(pair=0, xs=curliness, ys=lengths,
+                                                         point_distance=point_distance)
+        value_from_curliness_distance = self._pair_fitness(pair=1, xs=curliness, ys=further_distances,
+                                                           point_distance=point_distance)
+        value_from_distance_length = self._pair_fitness(pair=2, xs=further_distances, ys=lengths,
+                                                        point_distance=point_distance)
+        return value_from_distance_length + value_from_curliness_length + value_from_curliness_distance, \
+               value_from_distance_length, value_from_curliness_length, value_from_curliness_distance
+
+    def max_fitness_value(self, point_distance):
+        """
+        Highest total fitness a single trajectory can obtain.
+        Between the two hulls the fitness grows with the distance from the internal hull, its maximum is on a vertex of
+        the convex hull of the external hull as long as the internal hull is convex, like the hulls of the landscape
+        :param point_distance: modification to the fitness function
+        :return: float value
+        """
+        total = 0.0
+        for pair in range(len(LANDSCAPE_PAIRS)):
+            external, internal, _ = LANDSCAPE_PAIRS[pair]
+            vertices = np.array(self._landscape[external].convex_hull.exterior.coords)
+            distance = max([0.0] + [Point(x, y).distance(self._landscape[internal]) for x, y in vertices])
+            if pair not in point_distance:
+                total += convert(old_max=0, old_min=-150, new_max=MAX_FITNESS, new_min=-300, old_value=distance)
+            else:
+                total += max(MAX_FITNESS, convert(old_max=0, old_min=-150, new_max=100, new_min=-300,
+                                                  old_value=distance))
+        return total
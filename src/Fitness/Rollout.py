@@ -0,0 +1,181 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import random
+
+import numpy as np
+from neat.nn import FeedForwardNetwork
+
+from src.Alg.FeedForwardNetworkMine import FeedForwardNetworkMine
+from src.Fitness.ValueGraphFitness import VAL_NO_DATA, LIMIT_TIMESTEPS, convert
+from src.Helpers.Funcs import NEIGHBOURS
+from src.Helpers.Point import Point
+from src.Helpers.Trajectory import TrajectoryBatch
+
+# movement for every direction of the output of the network, same order as get_next_point and list_neighbours
+MOVES = np.array(NEIGHBOURS, dtype=np.int64)
+# from the bits of the neighbours on the street to which neighbours are on the street and their input flags
+ON_STREET = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1, bitorder='little').astype(bool)
+FLAGS = np.where(ON_STREET, 1, VAL_NO_DATA)
+STOP_DIRECTION = 8
+NUMBER_OF_INPUTS = 63
+
+
+class BatchedRollout(object):
+    """
+    Generates all the trajectories of a genome together, advancing all of them one step at the time.
+    Positions, live trajectories and timesteps are kept in numpy arrays and the input of the network is built for
+    all the live trajectories at once.
+    A trajectory is retired when the network stops, when it leaves the road or when it reaches LIMIT_TIMESTEPS
+    """
+
+    def __init__(self, net, road_mask, sub_matrix, random_streams=None):
+        """
+        :param net: network of the genome
+        :param road_mask: boolean raster of the routing system
+        :param sub_matrix: division in cells with the attractions
+        :param random_streams: random generator of every trajectory, None to use the random module
+        """
+        self._net = net
+        self._road_mask = road_mask
+        self._sub_matrix = sub_matrix
+        self._random_streams = random_streams
+
+    def run(self, starting_points, behaviours):
+        """
+        Generate the trajectories
+        :param starting_points: int array (n, 2) with the first position of every trajectory
+        :param behaviours: array (n, 6) with the behaviour given as input for every trajectory
+        :return: TrajectoryBatch with the positions visited by every trajectory
+        """
+        number_trajectories = starting_points.shape[0]
+        positions = np.array(starting_points, dtype=np.int64)
+        alive = np.ones(number_trajectories, dtype=bool)
+        timesteps = np.zeros(number_trajectories, dtype=np.int64)
+        trajectories = np.zeros((number_trajectories, LIMIT_TIMESTEPS + 1, 2), dtype=np.int16)
+
+        while np.any(alive):
+            live = np.flatnonzero(alive)
+            current = positions[live]
+            trajectories[live, timesteps[live]] = current
+
+            input_data = self._build_input(positions=current, timesteps=timesteps[live],
+                                           behaviours=behaviours[live])
+            output_network = self._activate(input_data=input_data)
+
+            # what if output is all the same and therefore no decision can be made? just exit
+            stop = np.sum(output_network[:, :-1], axis=1) == 0
+            direction = self._choose_direction(output_network=output_network, stop=stop, trajectories=live)
+            stop |= direction == STOP_DIRECTION
+
+            moving = np.flatnonzero(~stop)
+            next_positions = current.copy()
+            next_positions[moving] += MOVES[direction[moving]]
+            stop[moving] = ~self._on_road(positions=next_positions[moving])
+
+            timesteps[live] += 1
+            # set limit trajectory
+            stop |= timesteps[live] > LIMIT_TIMESTEPS
+
+            positions[live] = next_positions
+            alive[live[stop]] = False
+
+        if not isinstance(self._net, (FeedForwardNetwork, FeedForwardNetworkMine)):
+            # reset state network for next trajectories
+            self._net.reset_states()
+
+        offsets = np.zeros(number_trajectories + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(timesteps)
+        visited = np.arange(LIMIT_TIMESTEPS + 1)[np.newaxis, :] < timesteps[:, np.newaxis]
+        return TrajectoryBatch(offsets=offsets, coordinates=trajectories[visited])
+
+    def _build_input(self, positions, timesteps, behaviours):
+        """
+        Build the input of the network for all the live trajectories
+        For every neighbour there are the six attractions (or VAL_NO_DATA if not on the street), then if the
+        neighbours are on the street, the timesteps already moved and the behaviour
+        :param positions: current positions (m, 2)
+        :param timesteps: timesteps already moved (m)
+        :param behaviours: behaviours (m, 6)
+        :return: input matrix (m, 63)
+        """
+        neighbours_bits = self._sub_matrix.neighbours_on_street(positions=positions)
+        on_street = ON_STREET[neighbours_bits]
+        attractions = self._attractions(positions=positions, on_street=on_street)
+
+        all_the_charges = np.where(on_street[:, :, np.newaxis], attractions[:, np.newaxis, :],
+                                   float(VAL_NO_DATA)).reshape((positions.shape[0], -1))
+        final_with_additional = FLAGS[neighbours_bits]
+        steps = convert(old_max=LIMIT_TIMESTEPS, old_min=0, new_max=1, new_min=0, old_value=timesteps)
+
+        input_data = np.hstack([all_the_charges, final_with_additional, steps[:, np.newaxis], behaviours])
+        assert input_data.shape[1] == NUMBER_OF_INPUTS
+        assert (np.max(input_data) <= 1.0)
+        assert (np.min(input_data) >= -1.0)
+        return input_data
+
+    def _attractions(self, positions, on_street):
+        """
+        Attractions of the current positions, computed only where at least one neighbour is on the street
+        :param positions: current positions (m, 2)
+        :param on_street: neighbours on the street (m, 8)
+        :return: matrix (m, 6)
+        """
+        attractions = np.full((positions.shape[0], 6), float(VAL_NO_DATA))
+        rows = np.flatnonzero(np.any(on_street, axis=1))
+        attractions[rows], found = self._sub_matrix.attractions(positions=positions[rows])
+        for row in rows[~found]:
+            current_point = Point(x=int(positions[row, 0]), y=int(positions[row, 1]))
+            attractions[row] = self._sub_matrix.return_distance_from_point(current_position=current_point)
+        return attractions
+
+    def _on_road(self, positions):
+        """
+        Check if the positions are on the road
+        :param positions: positions (m, 2)
+        :return: boolean vector (m)
+        """
+        return self._road_mask[positions[:, 0], positions[:, 1]]
+
+    def _activate(self, input_data):
+        """
+        Activate the network on all the rows of the input
+        :param input_data: input matrix (m, 63)
+        :return: output matrix (m, 9)
+        """
+        if isinstance(self._net, FeedForwardNetworkMine):
+            return self._net.activate_batch(input_data)
+        if isinstance(self._net, FeedForwardNetwork):
+            return np.array([self._net.activate(row) for row in input_data.tolist()])
+        return self._net.predict(np.reshape(input_data, (-1, 1, NUMBER_OF_INPUTS)))
+
+    def _choose_direction(self, output_network, stop, trajectories):
+        """
+        Direction with the highest output, ties are broken randomly
+        :param output_network: output matrix (m, 9)
+        :param stop: trajectories already stopped, they do not need a direction
+        :param trajectories: index of the trajectory of every row (m)
+        :return: direction per row (m)
+        """
+        direction = np.argmax(output_network, axis=1)
+        val_max = output_network[np.arange(output_network.shape[0]), direction]
+        ties = np.sum(output_network == val_max[:, np.newaxis], axis=1) > 1
+        for row in np.flatnonzero(ties & ~stop):
+            indexes = np.flatnonzero(output_network[row] == val_max[row])
+            generator = random if self._random_streams is None else self._random_streams[trajectories[row]]
+            direction[row] = indexes[generator.randint(0, len(indexes) - 1)]
+        return direction
@@ -0,0 +1,73 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import numpy as np
+
+# euclidean distance between two different one-hot directions
+DIRECTION_CHANGE = np.sqrt(2.0)
+
+
+def compute_trajectory_metrics(trajectories):
+    """
+    Compute the behaviour of all the trajectories of a batch together
+    The behaviour is the length, the curliness (mean distance between consecutive one-hot directions), the cityblock
+    distance from the starting point to the furthest point (first and last point excluded), to the middle point and
+    to the end point
+    :param trajectories: TrajectoryBatch
+    :return: behaviours matrix (n, 5) and direction in degrees from the first to the last point of every trajectory (n)
+    """
+    lengths = trajectories.lengths()
+    number_trajectories = lengths.shape[0]
+    coordinates = trajectories.coordinates.astype(np.int64)
+    starts = trajectories.offsets[:-1]
+    not_empty = lengths > 0
+
+    behaviours = np.zeros((number_trajectories, 5))
+    angles = np.zeros(number_trajectories)
+    behaviours[:, 0] = lengths
+    if coordinates.shape[0] == 0:
+        return behaviours, angles
+
+    # owner trajectory and position inside the trajectory of every point of the buffer
+    owner = np.repeat(np.arange(number_trajectories), lengths)
+    step = np.arange(coordinates.shape[0]) - starts[owner]
+    distances_from_start = np.sum(np.abs(coordinates - coordinates[starts[owner]]), axis=1)
+
+    # the moves are between consecutive points of the same trajectory, directions change between consecutive moves
+    moves = coordinates[1:] - coordinates[:-1]
+    same_trajectory_move = owner[1:] == owner[:-1]
+    direction_code = (moves[:, 0] + 1) * 3 + moves[:, 1] + 1
+    changes = (direction_code[1:] != direction_code[:-1]) & same_trajectory_move[1:] & same_trajectory_move[:-1]
+    number_of_changes = np.bincount(owner[2:][changes], minlength=number_trajectories)
+    number_of_pairs = np.maximum(lengths - 2, 0)
+    with_pairs = number_of_pairs > 0
+    behaviours[with_pairs, 1] = DIRECTION_CHANGE * number_of_changes[with_pairs] / number_of_pairs[with_pairs]
+
+    inner = (step >= 1) & (step <= lengths[owner] - 2)
+    further = np.zeros(number_trajectories, dtype=np.int64)
+    np.maximum.at(further, owner[inner], distances_from_start[inner])
+    behaviours[:, 2] = further
+
+    middle = starts[not_empty] + lengths[not_empty] // 2
+    end = starts[not_empty] + lengths[not_empty] - 1
+    behaviours[not_empty, 3] = distances_from_start[middle]
+    behaviours[not_empty, 4] = distances_from_start[end]
+
+    delta = coordinates[end] - coordinates[starts[not_empty]]
+    degrees = np.arctan2(delta[:, 0], delta[:, 1]) / np.pi * 180
+    angles[not_empty] = np.where(degrees < 0, 360 + degrees, degrees)
+    return behaviours, angles
@@ -0,0 +1,57 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import numpy as np
+from scipy import sparse
+
+
+def compute_overlap_ratios(trajectories):
+    """
+    For every pair of trajectories (i, j) with i < j, the number of positions appearing exactly once in the two
+    trajectories together over the total number of positions of the two trajectories.
+    Same value of the drop_duplicates(keep=False) on the concatenation of the two trajectories.
+    Every visited pixel becomes an integer id and all the pairs are computed with one sparse product:
+    a position is kept if it appears once in i and never in j, or the other way round
+    :param trajectories: TrajectoryBatch
+    :return: vector with the ratios of the pairs, in the order (0, 1), (0, 2), ..., (1, 2), ...
+    """
+    lengths = trajectories.lengths()
+    number_trajectories = lengths.shape[0]
+    first, second = np.triu_indices(number_trajectories, k=1)
+    if first.shape[0] == 0:
+        return np.zeros(0)
+
+    coordinates = trajectories.coordinates.astype(np.int64)
+    owner = np.repeat(np.arange(number_trajectories), lengths)
+    pixels = (coordinates[:, 0] << 16) | (coordinates[:, 1] & 0xFFFF)
+    # how many times every trajectory visits every pixel
+    _, pixel_ids = np.unique(pixels, return_inverse=True)
+    pixel_ids = pixel_ids.reshape(-1)
+    visits, multiplicity = np.unique(np.stack([owner, pixel_ids], axis=1), axis=0, return_counts=True)
+    shape = (number_trajectories, int(pixel_ids.max()) + 1)
+    presence = sparse.csr_matrix((np.ones(visits.shape[0], dtype=np.int64), (visits[:, 0], visits[:, 1])),
+                                 shape=shape)
+    once = multiplicity == 1
+    singles = sparse.csr_matrix((np.ones(np.count_nonzero(once), dtype=np.int64),
+                                 (visits[once, 0], visits[once, 1])), shape=shape)
+
+    # pixels visited once by the first trajectory and also visited by the second one
+    shared_singles = (singles @ presence.T).toarray()
+    number_of_singles = np.asarray(singles.sum(axis=1)).ravel()
+    unique_positions = number_of_singles[first] + number_of_singles[second] - shared_singles[first, second] - \
+                       shared_singles[second, first]
+    return unique_positions / (lengths[first] + lengths[second])
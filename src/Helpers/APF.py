@@ -19,6 +19,8 @@ import numpy as np
 
 import pandas as pd
 import warnings
+
+from src.Helpers.Funcs import load_cached_array
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 class LoadAPF(object):
@@ -30,6 +32,7 @@ class LoadAPF(object):
         self._path = path
         self._log = logger
         self.apf = None
+        self.road_mask = None
         self.coordinates = {}
         self.x_values = []
         self.y_values = []
@@ -46,6 +49,23 @@ class LoadAPF(object):
         if self._log is not None:
             self._log.info("APF with routing system loaded {}".format(self.apf.shape))
 
+    def load_road_mask(self, threshold=40):
+        """
+        Boolean raster of the routing system, True where the cell is a road (APF not below threshold).
+        It is built once from the APF and cached as memory mapped file next to it
+        :param threshold: minimum value of the APF to be a road
+        :return:
+        """
+        def build():
+            if self.apf is None:
+                self.load_apf_only_routing_system()
+            apf = self.apf.values if isinstance(self.apf, pd.DataFrame) else np.asarray(self.apf)
+            return ~(apf < threshold)
+
+        self.road_mask = load_cached_array(path="{}_road_mask_{}.npy".format(self._path, threshold), build=build)
+        if self._log is not None:
+            self._log.info("Road mask loaded {}".format(self.road_mask.shape))
+
     def save_apf(self, path_file="apf.csv"):
         """
         Saves the APF to file
@@ -69,11 +89,12 @@ class LoadAPF(object):
                 self._log.debug("Inverting Heat Map.")
             self.apf = self.apf.iloc[::-1]
 
-    def match_index_with_coordinates(self):
+    def match_index_with_coordinates(self, shape=None):
         """
         The APF has index from 0 to N
         Every cells correspond to real world coordinates
         This method matches the to systems
+        :param shape: shape of the APF, None to take it from the APF loaded
         :return:
         """
         if self._log is not None:
@@ -86,8 +107,10 @@ class LoadAPF(object):
             "west": 14.1}
 
         # resolution image
-        x_max = self.apf.shape[0]
-        y_max = self.apf.shape[1]
+        if shape is None:
+            shape = self.apf.shape
+        x_max = shape[0]
+        y_max = shape[1]
 
         # creation of the real coordinates
         # now the index correspond to a real coordinate
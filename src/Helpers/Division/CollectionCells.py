@@ -18,6 +18,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import numpy as np
 import warnings
 
+from src.Helpers.Funcs import load_cached_array, build_neighbours_mask
 from src.Settings.arguments import args
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -36,6 +37,12 @@ class CollectionCells(object):
         self._save_and_store = save_and_store
         self.max_values = None
         self.min_values = None
+        self.street_mask = None
+        self.neighbours_mask = None
+        self.attraction_keys = None
+        self.attraction_values = None
+        self._data_input = None
+        self._indexing = None
 
 
 
@@ -136,6 +143,7 @@ class CollectionCells(object):
         else:
             name_file = "{}/cell_data_to_mmap_normalised.dat".format(args.data_directory)
             data_input = np.memmap(name_file, dtype='float32', mode='r', shape=(154, 155, 6, 2, 1600))
+        self._data_input = data_input
         count = 0
         for k, cell in self._list_cells.items():
             cell.matrix = data_input
@@ -144,5 +152,71 @@ class CollectionCells(object):
 
         name_file = "{}/indexing_fast.dat".format(args.data_directory)
         ndexing = np.memmap(name_file, dtype='int16', mode='r', shape=(6159, 6083, 2))
+        self._indexing = ndexing
+        # boolean raster of the streets, cached to not read the indexing for every check
+        self.street_mask = load_cached_array(path="{}/indexing_fast_street_mask.npy".format(args.data_directory),
+                                             build=lambda: ndexing[:, :, 0] != 0)
+        # which of the eight neighbours of every cell are on the street, one bit each
+        self.neighbours_mask = load_cached_array(
+            path="{}/indexing_fast_neighbours_mask.npy".format(args.data_directory),
+            build=lambda: build_neighbours_mask(mask=self.street_mask))
         for k, cell in self._list_cells.items():
             cell._indexing = ndexing
+            cell._street_mask = self.street_mask
+
+    def load_attractions(self, coordinate_index, number_of_features, not_normalised=False):
+        """
+        Precompute the attractions of every position with at least one neighbour on the street, the only positions
+        the attractions are asked for.
+        The positions are kept sorted by flat index (attraction_keys) with their attractions in the same order
+        (attraction_values), so all the attractions of a position are a single contiguous read.
+        Both are cached as memory mapped files
+        :param coordinate_index: memmap with the id of the cell of every position
+        :param number_of_features: how many attractions per position
+        :param not_normalised: which data has been loaded by load_mmap_data
+        :return:
+        """
+        name = "not_normalised" if not_normalised else "normalised"
+        self.attraction_keys = load_cached_array(
+            path="{}/attractions_keys_{}.npy".format(args.data_directory, name),
+            build=lambda: self._build_attraction_keys(coordinate_index=coordinate_index))
+        self.attraction_values = load_cached_array(
+            path="{}/attractions_values_{}.npy".format(args.data_directory, name),
+            build=lambda: self._build_attraction_values(coordinate_index=coordinate_index,
+                                                        number_of_features=number_of_features))
+
+    def _cell_indexes(self, coordinate_index, xs, ys):
+        """
+        Index in the data of the cell of every position, same id used by SubMatrix.return_distance_from_point
+        :param coordinate_index: memmap with the id of the cell of every position
+        :param xs: x coordinates
+        :param ys: y coordinates
+        :return: int vector, -1 if the cell does not exist
+        """
+        cell_ids, inverse = np.unique(np.asarray(coordinate_index[xs, ys]), axis=0, return_inverse=True)
+        indexes = np.full(cell_ids.shape[0], -1, dtype=np.int64)
+        for row, (i, j) in enumerate(cell_ids):
+            cell = self._list_cells.get("{}-{}".format(i, j))
+            if cell is not None:
+                indexes[row] = cell.index
+        return indexes[inverse.reshape(-1)]
+
+    def _build_attraction_keys(self, coordinate_index):
+        keys = np.flatnonzero(np.asarray(self.neighbours_mask).ravel() != 0)
+        xs, ys = np.unravel_index(keys, self.neighbours_mask.shape)
+        cell_indexes = self._cell_indexes(coordinate_index=coordinate_index, xs=xs, ys=ys)
+        # positions without a cell are left to SubMatrix.return_distance_from_point
+        return keys[cell_indexes >= 0]
+
+    def _build_attraction_values(self, coordinate_index, number_of_features, chunk=1000000):
+        keys = np.asarray(self.attraction_keys)
+        values = np.zeros((keys.shape[0], number_of_features), dtype=self._data_input.dtype)
+        for start in range(0, keys.shape[0], chunk):
+            xs, ys = np.unravel_index(keys[start:start + chunk], self.neighbours_mask.shape)
+            cell_indexes = self._cell_indexes(coordinate_index=coordinate_index, xs=xs, ys=ys)
+            position_in_cell = np.asarray(self._indexing[xs, ys], dtype=np.int64)
+            for feature in range(number_of_features):
+                values[start:start + chunk, feature] = self._data_input[position_in_cell[:, 0],
+                                                                        position_in_cell[:, 1], feature, 0,
+                                                                        cell_indexes]
+        return values
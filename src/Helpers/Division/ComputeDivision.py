@@ -72,6 +72,9 @@ class SubMatrix(object):
             self._log.debug("Point division loaded from file")
 
         self._list_of_cells.load_mmap_data(not_normalised=not_normalised)
+        self._list_of_cells.load_attractions(coordinate_index=self._coordinate_index,
+                                             number_of_features=len(self._match_key_index.keys()),
+                                             not_normalised=not_normalised)
         #
         # # for performance support
         self._log = None
@@ -150,6 +153,21 @@ class SubMatrix(object):
                                                            index=i) for i in range(len(self._match_key_index.keys()))]
         return vector_distances
 
+    def attractions(self, positions):
+        """
+        Vectorised version of return_distance_from_point using the precomputed attractions
+        :param positions: int array (m, 2) with the matrix coordinates
+        :return: attractions (m, number of features) and boolean vector (m) of the positions found in the
+                 precomputed attractions. For the others the attractions are not valid
+        """
+        keys = self._list_of_cells.attraction_keys
+        if keys.shape[0] == 0:
+            return np.zeros((positions.shape[0], len(self._match_key_index.keys()))), np.zeros(positions.shape[0], bool)
+        flat_positions = positions[:, 0] * self._list_of_cells.neighbours_mask.shape[1] + positions[:, 1]
+        index = np.minimum(np.searchsorted(keys, flat_positions), keys.shape[0] - 1)
+        found = keys[index] == flat_positions
+        return self._list_of_cells.attraction_values[index], found
+
     def keep_only_points_on_street(self, points):
         """
         Check if the points provided are on a route
@@ -157,16 +175,16 @@ class SubMatrix(object):
         :param points: list of points to check
         :return: list of points from the input list that are actually on a route
         """
-        points_on_street = []
-        for p in points:
-            # id_current_cell = self._list_of_cells.find_current_cell_from_matrix_coord(point=p)
-            # optimised way with mmeap
-            raw_id_cell = self._coordinate_index[p.x][p.y]
-            id_current_cell = "{}-{}".format(raw_id_cell[0], raw_id_cell[1])
-            cell = self._list_of_cells.get_cell_from_id(id=id_current_cell)
-            if cell.check_if_on_a_road(point=p):
-                points_on_street.append(p)
-        return points_on_street
+        street_mask = self._list_of_cells.street_mask
+        return [p for p in points if street_mask[p.x, p.y]]
+
+    def neighbours_on_street(self, positions):
+        """
+        Which of the eight neighbours of the positions are on a route, as bits (bit k for neighbour k)
+        :param positions: int array (m, 2) with the matrix coordinates
+        :return: uint8 vector (m)
+        """
+        return self._list_of_cells.neighbours_mask[positions[:, 0], positions[:, 1]]
 
     def verify_if_file_i_have_is_correct(self):
         name_file = "/Users/alessandrozonta/Desktop/cell_data_to_mmap.dat"
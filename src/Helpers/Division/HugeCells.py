@@ -30,6 +30,7 @@ class HugeCell(object):
         self._min_y_cell = min_y_cell
         self._max_y_cell = max_y_cell
         self._indexing = None
+        self._street_mask = None
         self.index = 0
 
 
@@ -96,4 +97,4 @@ class HugeCell(object):
         :return:
         """
 
-        return False if self._indexing[point.x, point.y, 0] == 0 else True
+        return bool(self._street_mask[point.x, point.y])
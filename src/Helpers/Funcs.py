@@ -15,10 +15,18 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import hashlib
+import os
+import random
 import re
 
+import numpy as np
+
 from src.Helpers.Point import Point
 
+# offset of the eight neighbours, same order of list_neighbours and of the directions of the network
+NEIGHBOURS = [(-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0)]
+
 
 def sorted_nicely(l):
     """ Sort the given iterable in the way that humans expect."""
@@ -27,6 +35,63 @@ def sorted_nicely(l):
     return sorted(l, key=alphanum_key)
 
 
+def random_streams(seed, generation, genome_key, number):
+    """
+    Independent random generator for every trajectory of a genome in a generation.
+    The generators depend only on the seed of the run, the generation, the genome and the index of the trajectory,
+    so the trajectories are the same whatever process generates them
+    :param seed: seed of the run
+    :param generation: current generation
+    :param genome_key: key of the genome
+    :param number: number of trajectories
+    :return: list of random.Random
+    """
+    streams = []
+    for i in range(number):
+        digest = hashlib.sha256("{}-{}-{}-{}".format(seed, generation, genome_key, i).encode("utf-8")).digest()
+        streams.append(random.Random(int.from_bytes(digest[:8], "little")))
+    return streams
+
+
+def load_cached_array(path, build):
+    """
+    Load the array cached in a .npy file as read-only memory map.
+    If the file does not exist the array is built and cached. The file is written under a temporary name and then
+    renamed, so processes building it at the same time never read a partial file.
+    If the directory is not writable the array is returned without caching it
+    :param path: path of the .npy file
+    :param build: function without arguments returning the array
+    :return: numpy array
+    """
+    if os.path.isfile(path):
+        return np.load(path, mmap_mode='r')
+    array = build()
+    temporary_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        with open(temporary_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(temporary_path, path)
+    except OSError:
+        return array
+    return np.load(path, mmap_mode='r')
+
+
+def build_neighbours_mask(mask):
+    """
+    For every cell of the raster, one bit per neighbour (bit k for NEIGHBOURS[k]) set if that neighbour is inside the
+    raster and True in the mask
+    :param mask: boolean raster
+    :return: uint8 raster with the same shape of the mask
+    """
+    height, width = mask.shape
+    padded = np.zeros((height + 2, width + 2), dtype=np.uint8)
+    padded[1:-1, 1:-1] = mask
+    bits = np.zeros((height, width), dtype=np.uint8)
+    for k, (dx, dy) in enumerate(NEIGHBOURS):
+        bits |= padded[1 + dx:1 + dx + height, 1 + dy:1 + dy + width] << np.uint8(k)
+    return bits
+
+
 def list_neighbours(x_value, y_value, apf, list_already_visited=None):
     """
     Return all the neighbours cells.
@@ -0,0 +1,143 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import numpy as np
+
+from src.Helpers.Point import Point
+
+
+class Trajectory(object):
+    """
+    Trajectory stored as an int16 array (length, 2) with the matrix coordinates of the positions visited.
+    Indexing and iterating return Point objects, so it can be used where the list of Point was used
+    """
+    __slots__ = ['coordinates']
+
+    def __init__(self, coordinates):
+        self.coordinates = np.asarray(coordinates, dtype=np.int16).reshape((-1, 2))
+
+    def __len__(self):
+        return self.coordinates.shape[0]
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return Trajectory(coordinates=self.coordinates[item])
+        x, y = self.coordinates[item]
+        return Point(x=int(x), y=int(y))
+
+    def __iter__(self):
+        for x, y in self.coordinates.tolist():
+            yield Point(x=x, y=y)
+
+    def __eq__(self, other):
+        return isinstance(other, Trajectory) and np.array_equal(self.coordinates, other.coordinates)
+
+    def __getstate__(self):
+        return (self.coordinates,)
+
+    def __setstate__(self, state):
+        self.coordinates = state[0]
+
+    def vect(self):
+        """
+        Return the trajectory as a list of coordinates
+        :return: list of [x, y]
+        """
+        return self.coordinates.tolist()
+
+
+class TrajectoryBatch(object):
+    """
+    Ragged collection of trajectories: one flat int16 buffer (total length, 2) with all the positions and the offsets
+    where every trajectory starts.
+    Trajectory i is coordinates[offsets[i]:offsets[i + 1]]. Indexing returns a Trajectory viewing the buffer
+    """
+
+    def __init__(self, offsets, coordinates):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.coordinates = np.asarray(coordinates, dtype=np.int16).reshape((-1, 2))
+
+    @staticmethod
+    def from_trajectories(trajectories):
+        """
+        Build the batch from a list of trajectories
+        :param trajectories: list of Trajectory, of arrays (length, 2) or of lists of Point
+        :return: TrajectoryBatch
+        """
+        all_the_coordinates = [to_coordinates(trajectory=tra) for tra in trajectories]
+        offsets = np.zeros(len(all_the_coordinates) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([el.shape[0] for el in all_the_coordinates])
+        if len(all_the_coordinates) > 0:
+            coordinates = np.concatenate(all_the_coordinates)
+        else:
+            coordinates = np.zeros((0, 2), dtype=np.int16)
+        return TrajectoryBatch(offsets=offsets, coordinates=coordinates)
+
+    @staticmethod
+    def concatenate(batches):
+        """
+        Join batches of trajectories, in order
+        :param batches: list of TrajectoryBatch
+        :return: TrajectoryBatch
+        """
+        lengths = np.concatenate([[0]] + [el.lengths() for el in batches])
+        coordinates = [np.asarray(el.coordinates) for el in batches]
+        if len(coordinates) > 0:
+            coordinates = np.concatenate(coordinates)
+        else:
+            coordinates = np.zeros((0, 2), dtype=np.int16)
+        return TrajectoryBatch(offsets=np.cumsum(lengths), coordinates=coordinates)
+
+    def lengths(self):
+        """
+        Length of every trajectory
+        :return: int vector
+        """
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return self.offsets.shape[0] - 1
+
+    def __getitem__(self, item):
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("trajectory index out of range")
+        return Trajectory(coordinates=self.coordinates[self.offsets[item]:self.offsets[item + 1]])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getstate__(self):
+        return self.offsets, self.coordinates
+
+    def __setstate__(self, state):
+        self.offsets, self.coordinates = state
+
+
+def to_coordinates(trajectory):
+    """
+    Coordinates of a trajectory, also for the trajectories stored as list of Point by the previous versions
+    :param trajectory: Trajectory, array (length, 2) or list of Point
+    :return: int16 array (length, 2)
+    """
+    if isinstance(trajectory, Trajectory):
+        return trajectory.coordinates
+    if isinstance(trajectory, np.ndarray):
+        return trajectory.astype(np.int16).reshape((-1, 2))
+    return np.array([[int(p.x), int(p.y)] for p in trajectory], dtype=np.int16).reshape((-1, 2))
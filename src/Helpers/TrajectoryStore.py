@@ -0,0 +1,83 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+
+import numpy as np
+
+from src.Helpers.Trajectory import TrajectoryBatch
+
+
+class TrajectoryHandle(object):
+    """
+    Where the trajectories of a genome are in the trajectory store: file, byte offset and offsets of every
+    trajectory. It is what the genome keeps instead of the trajectories
+    """
+    __slots__ = ['path', 'offset', 'offsets']
+
+    def __init__(self, path, offset, offsets):
+        self.path = path
+        self.offset = offset
+        self.offsets = offsets
+
+    def __getstate__(self):
+        return self.path, self.offset, self.offsets
+
+    def __setstate__(self, state):
+        self.path, self.offset, self.offsets = state
+
+    def __len__(self):
+        return self.offsets.shape[0] - 1
+
+    def load(self, directory=None):
+        """
+        Read the trajectories, the coordinates are memory mapped
+        :param directory: directory of the store, if it has been moved after the run
+        :return: TrajectoryBatch
+        """
+        path = self.path if directory is None else os.path.join(directory, *self.path.split(os.sep)[-2:])
+        number_of_positions = int(self.offsets[-1])
+        if number_of_positions == 0:
+            return TrajectoryBatch(offsets=self.offsets, coordinates=np.zeros((0, 2), dtype=np.int16))
+        coordinates = np.memmap(path, dtype=np.int16, mode='r', offset=self.offset, shape=(number_of_positions, 2))
+        return TrajectoryBatch(offsets=self.offsets, coordinates=coordinates)
+
+
+class TrajectoryStore(object):
+    """
+    Append-only store of the trajectories generated during the evolution, one folder per generation.
+    Every worker appends the coordinates of the trajectories it generates to its own file and returns a
+    TrajectoryHandle, so the trajectories never go through the main process
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def write(self, generation, trajectories):
+        """
+        Append the trajectories of a genome to the file of the current process
+        :param generation: current generation
+        :param trajectories: TrajectoryBatch
+        :return: TrajectoryHandle
+        """
+        folder = os.path.join(self._directory, "generation_{}".format(generation))
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, "worker_{}.dat".format(os.getpid()))
+        with open(path, "ab") as f:
+            offset = f.tell()
+            f.write(np.ascontiguousarray(trajectories.coordinates, dtype=np.int16).tobytes())
+        return TrajectoryHandle(path=path, offset=offset, offsets=np.array(trajectories.offsets, dtype=np.int64))
@@ -0,0 +1,198 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import pickle
+
+import numpy as np
+
+from src.Fitness.FitnessGrid import FitnessGrid, LANDSCAPE_PAIRS
+from src.Helpers.APF import LoadAPF
+from src.Helpers.Division.ComputeDivision import SubMatrix
+from src.Helpers.GenomePhenome import GenomeMeaning
+from src.Settings.arguments import args
+
+
+class World(object):
+    """
+    Everything the generation of the trajectories reads from disk: routing system and its road mask, division in
+    cells with the attractions, starting points of the train trajectories and fitness landscape
+    """
+
+    def __init__(self, logger=None):
+        self._log = logger
+        # values of the APF, not loaded when the road mask comes from the shared world
+        self.apf = None
+        self.road_mask = None
+        self.sub_matrix = None
+        self.real_tra_train = None
+        self.fitness_landscape = None
+        self.config = None
+        self.trajectory_store = None
+
+    def load(self, shared=None):
+        """
+        Load the world from the data directory
+        The arrays already published by the main process are attached instead of being loaded again
+        :param shared: SharedWorld with the arrays published by the main process, None to load everything
+        :return:
+        """
+        if self._log is not None:
+            self._log.debug("Loading the world...")
+        loader_apf = LoadAPF(path="{}/the_right_one_fast".format(args.data_directory), logger=self._log)
+        if shared is not None and shared.has("road_mask"):
+            # the road mask is all the trajectories need of the APF, it is not loaded
+            loader_apf.road_mask = shared.attach("road_mask")
+        else:
+            loader_apf.load_apf_only_routing_system()
+            loader_apf.apf = loader_apf.apf.values
+            loader_apf.load_road_mask()
+        loader_apf.match_index_with_coordinates(shape=loader_apf.road_mask.shape)
+        self.apf = loader_apf.apf
+        self.road_mask = loader_apf.road_mask
+
+        loader_genome_meaning = GenomeMeaning(logger=self._log)
+        loader_genome_meaning.load_data()
+
+        self.sub_matrix = SubMatrix(log=self._log, apf=loader_apf.apf,
+                                    list_points=loader_genome_meaning.name_typologies,
+                                    values_matrix=(loader_apf.x_values, loader_apf.y_values))
+        self.sub_matrix.divide_into_cells()
+
+        self.real_tra_train = np.load("{}/real_tra_train_starting_points.npy".format(args.data_directory),
+                                      allow_pickle=True)
+
+        self.fitness_landscape = load_fitness_landscape(shared=shared, logger=self._log)
+        if self._log is not None:
+            self._log.info("World loaded")
+
+
+def load_fitness_landscape(shared=None, logger=None):
+    """
+    Fitness landscape of the data directory, with the fitness grid if --fitness_grid.
+    The grid shared by the main process is attached, otherwise it is read from the data directory, where it is built
+    and written the first time
+    :param shared: SharedWorld with the arrays published by the main process, None to not use it
+    :param logger: logger
+    :return: FitnessGrid
+    """
+    with open("{}/3d_fitness_in_2d_with_limitation.pickle".format(args.data_directory), 'rb') as handle:
+        fitness_landscape = pickle.load(handle)
+    if not args.fitness_grid:
+        return FitnessGrid(fitness_landscape=fitness_landscape, logger=logger)
+    if shared is not None and shared.has("fitness_grid_0"):
+        grids = [shared.attach("fitness_grid_{}".format(i)) for i in range(len(LANDSCAPE_PAIRS))]
+        return FitnessGrid(fitness_landscape=fitness_landscape, grids=grids, logger=logger)
+    return FitnessGrid(fitness_landscape=fitness_landscape, logger=logger,
+                       grid_path="{}/3d_fitness_in_2d_with_limitation_grid.npz".format(args.data_directory))
+
+
+class SharedWorld(object):
+    """
+    Arrays of the world written once by the main process into read-only memory mapped files.
+    The workers attach to them as numpy views, the operating system keeps a single copy in memory for all of them
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._arrays = {}
+
+    def publish(self, name, array):
+        """
+        Write the array to its memory mapped file
+        :param name: name of the array
+        :param array: numpy array to share
+        :return:
+        """
+        array = np.ascontiguousarray(array)
+        path = os.path.join(self._directory, "{}.dat".format(name))
+        fp = np.memmap(path, dtype=array.dtype, mode='w+', shape=array.shape)
+        fp[:] = array[:]
+        fp.flush()
+        del fp
+        self._arrays[name] = (path, array.dtype.str, array.shape)
+
+    def has(self, name):
+        return name in self._arrays
+
+    def attach(self, name):
+        """
+        Return a read-only view of the array published with the given name
+        :param name: name of the array
+        :return: numpy memmap
+        """
+        path, dtype, shape = self._arrays[name]
+        return np.memmap(path, dtype=dtype, mode='r', shape=shape)
+
+
+def publish_world(directory, logger=None):
+    """
+    Load the big arrays of the world once and publish them for all the workers.
+    Of the APF only the road mask is published: the workers read the routing system from it and the coordinates of
+    the cells from its shape
+    :param directory: directory where to write the memory mapped files
+    :param logger: logger
+    :return: SharedWorld to hand to the workers
+    """
+    os.makedirs(directory, exist_ok=True)
+    shared = SharedWorld(directory=directory)
+
+    loader_apf = LoadAPF(path="{}/the_right_one_fast".format(args.data_directory), logger=logger)
+    # the APF is read only if the road mask is not cached yet
+    loader_apf.load_road_mask()
+    shared.publish(name="road_mask", array=loader_apf.road_mask)
+
+    # the grid is built here once, not by every worker at the same time
+    fitness_landscape = load_fitness_landscape(logger=logger)
+    if fitness_landscape.grids is not None:
+        for i, grid in enumerate(fitness_landscape.grids):
+            shared.publish(name="fitness_grid_{}".format(i), array=grid)
+
+    if logger is not None:
+        logger.info("World shared in {}".format(directory))
+    return shared
+
+
+# world of the current process
+_world = None
+
+
+def init_worker(shared=None, config=None, trajectory_store=None):
+    """
+    Initializer of the evaluation workers
+    The world is loaded once and then reused by every genome the process evaluates
+    :param shared: SharedWorld published by the main process
+    :param config: NEAT config, sent once per worker instead of with every genome
+    :param trajectory_store: TrajectoryStore where to write the trajectories, None to not store them
+    :return:
+    """
+    global _world
+    _world = World()
+    _world.load(shared=shared)
+    _world.config = config
+    _world.trajectory_store = trajectory_store
+
+
+def get_world(shared=None):
+    """
+    Return the world of the current process, loading it if this process has not done it yet
+    :param shared: SharedWorld published by the main process
+    :return: World
+    """
+    if _world is None:
+        init_worker(shared=shared)
+    return _world
@@ -86,6 +86,13 @@ if __name__ == "__main__":
     mlflow.log_param("fitness_definition", args.fitness_definition)
     mlflow.log_param("point_distance", args.point_distance)
     mlflow.log_param("random_point_start", args.random_point_start)
+    mlflow.log_param("persistent_workers", args.persistent_workers)
+    mlflow.log_param("fitness_grid", args.fitness_grid)
+    mlflow.log_param("archive_size", args.archive_size)
+    mlflow.log_param("evaluation_cache", args.evaluation_cache)
+    mlflow.log_param("racing_stages", args.racing_stages)
+    mlflow.log_param("racing_percentile", args.racing_percentile)
+    mlflow.log_param("evaluation_journal", args.evaluation_journal)
 
     max_fitness_possible = _get_max_fitness_possible(fitness_definition=args.fitness_definition)
     mlflow.log_param("max_fitness_possible", max_fitness_possible)
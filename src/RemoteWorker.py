@@ -0,0 +1,39 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+import multiprocessing
+
+from src.Alg.RemotePool import get_authkey, run_worker, parse_address
+from src.Helpers.World import load_fitness_landscape
+from src.Settings.arguments import args
+
+if __name__ == "__main__":
+    # started with the same arguments of the main process, --remote_address is where the main process is waiting
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # the fitness grid missing in the data directory is built once here, the workers only read it
+    load_fitness_landscape(logger=logging.getLogger())
+    logging.info("Connecting {} workers to {}".format(args.processes, args.remote_address))
+    # every process is a worker of the main process, with its own world
+    workers = [multiprocessing.Process(target=run_worker, kwargs={"address": parse_address(args.remote_address),
+                                                                  "authkey": get_authkey(args.remote_authkey)})
+               for _ in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    logging.info("End workers")
@@ -16,6 +16,7 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import argparse
+import multiprocessing
 
 
 def prepare_parser():
@@ -31,6 +32,9 @@ def prepare_parser():
                                                             "central point")
     parser.add_argument("--penalty_behaviours", action='store_true', help="Add penalty for not having different"
                                                                           " trajecotires with different behaviours")
+    parser.add_argument("--archive_size", type=int, default=0, help="Max number of behaviours in the novelty "
+                                                                    "archive, the oldest are removed first. 0 for "
+                                                                    "no limit")
     parser.add_argument("--generations", "-g", type=int, default=10, help="Set number max of generations")
     parser.add_argument("--numb_of_tra", "-n", type=int, default=30, help="Number of trajectories to generate"
                                                                           " with the same model")
@@ -38,6 +42,23 @@ def prepare_parser():
     # program settigs
     parser.add_argument("--freq_checkpoints", "-fr", type=int, default=10, help="Every how many generations to "
                                                                                 "save a checkpoint")
+    parser.add_argument("--compact_checkpoints", action='store_true', help="Save in the checkpoints only genes, "
+                                                                           "species, random state and novelty "
+                                                                           "archive, without the trajectories and "
+                                                                           "the config")
+    parser.add_argument("--checkpoint_compression", type=int, default=None, help="gzip level of the checkpoints, "
+                                                                                 "default 1 for the compact ones "
+                                                                                 "and 5 otherwise")
+    parser.add_argument("--keep_checkpoints", type=int, default=0, help="Number of checkpoints to keep, the older "
+                                                                        "ones are removed. 0 to keep all of them")
+    parser.add_argument("--background_checkpoints", action='store_true', help="Compress and write the checkpoints "
+                                                                              "on a background thread while the "
+                                                                              "next generation is evaluated")
+    parser.add_argument("--evaluation_journal", action='store_true', help="Write every genome evaluation in a "
+                                                                          "journal in the output directory. "
+                                                                          "Restoring a checkpoint in the same "
+                                                                          "output directory, the genomes already "
+                                                                          "evaluated are not evaluated again")
     parser.add_argument("--output_directory", "-o", type=str,
                         default="/Users/alessandrozonta/PycharmProjects/NEAT/Output/",
                         help="Directory where to save"
@@ -58,6 +79,78 @@ def prepare_parser():
     parser.add_argument("--random_point_start", action='store_true', help="Force program to have random different "
                                                                           "initial point per individual")
 
+    parser.add_argument("--persistent_workers", action='store_true', help="Keep the evaluation workers alive for "
+                                                                          "the whole run, loading the world only "
+                                                                          "once per worker")
+
+    parser.add_argument("--shared_directory", type=str, default="", help="Directory where the main process writes "
+                                                                         "the world shared with the workers "
+                                                                         "(e.g. /dev/shm). Default is the output "
+                                                                         "directory")
+
+    parser.add_argument("--fitness_grid", action='store_true', help="Score the trajectories on a precomputed grid of "
+                                                                    "the fitness landscape instead of evaluating "
+                                                                    "the hulls exactly")
+
+    parser.add_argument("--keep_trajectories", action='store_true', help="Send the trajectories of every genome back "
+                                                                         "to the main process and store them in the "
+                                                                         "genome")
+
+    parser.add_argument("--store_trajectories", action='store_true', help="The workers write the trajectories of "
+                                                                          "every generation in the output directory, "
+                                                                          "the genome keeps only where they are")
+
+    parser.add_argument("--evaluation_cache", type=int, default=0, help="Number of genome evaluations to remember, "
+                                                                        "identical genomes are not evaluated again. "
+                                                                        "The first evaluation of a network is "
+                                                                        "reused in later generations, even if "
+                                                                        "random starting points and ties would "
+                                                                        "give different trajectories. 0 to disable")
+
+    parser.add_argument("--trajectory_chunks", action='store_true', help="Split the evaluation in chunks of "
+                                                                         "trajectories of the genomes, combined in "
+                                                                         "the main process. The workers are kept "
+                                                                         "alive for the whole run")
+
+    parser.add_argument("--racing_stages", type=int, default=1, help="Generate the trajectories of the genomes in "
+                                                                     "stages and after every stage stop the genomes "
+                                                                     "that cannot reach --racing_percentile of the "
+                                                                     "previous generation. 1 to disable, it implies "
+                                                                     "--trajectory_chunks")
+
+    parser.add_argument("--racing_percentile", type=float, default=50., help="Percentile of the real fitness of the "
+                                                                             "previous generation a genome has to be "
+                                                                             "able to reach to not be stopped")
+
+    parser.add_argument("--remote_address", type=str, default="", help="host:port where the main process waits for "
+                                                                       "the remote workers (src/RemoteWorker.py, "
+                                                                       "started with the same arguments and the "
+                                                                       "host:port of the main process). Empty to "
+                                                                       "evaluate locally. It implies "
+                                                                       "--trajectory_chunks")
+
+    parser.add_argument("--remote_authkey", type=str, default=None, help="Key shared by the main process and the "
+                                                                          "remote workers, required with "
+                                                                          "--remote_address. If not given it is "
+                                                                          "read from the environment variable "
+                                                                          "TRAJECTORIESNEAT_AUTHKEY")
+
+    parser.add_argument("--remote_workers", type=int, default=0, help="Expected number of remote workers, used to "
+                                                                      "size the chunks of trajectories. 0 to use "
+                                                                      "the workers connected when the run starts")
+
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(),
+                        help="Worker processes started by src/RemoteWorker.py on its host. Default: the number of "
+                             "cores of the host")
+
+    parser.add_argument("--task_deadline", type=float, default=0, help="Seconds after which an evaluation task is "
+                                                                       "considered lost (dead or hanging worker) and "
+                                                                       "sent again. 0 for no deadline, the lost "
+                                                                       "tasks are still sent again as stragglers")
+
+    parser.add_argument("--task_attempts", type=int, default=3, help="Attempts of every evaluation task before the "
+                                                                     "generation fails")
+
     parser.add_argument("--number_of_test_trajectories", type=int, default=100, help="how many trajectories to "
                                                                                      "generate at the end to test "
                                                                                      "the winning genome")
@@ -0,0 +1,153 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import math
+import os
+import random
+
+import neat
+import numpy as np
+from shapely.geometry import box
+
+from src.Alg.FeedForwardNetworkMine import FeedForwardNetworkMine
+from src.Alg.GenomeMine import NoveltyGenome
+from src.Alg.ParallelEvaluatorMine import make_result
+from src.Fitness.GeneralFitness import combine_general_fitness, generate_trajectories
+from src.Helpers.Funcs import build_neighbours_mask, random_streams
+
+# small random world: routing system, streets with the attractions and a fitness landscape made of boxes
+HEIGHT, WIDTH = 60, 70
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "Settings",
+                           "config-neat")
+
+_rng = np.random.RandomState(3)
+apf = np.where(_rng.rand(HEIGHT, WIDTH) < 0.85, 100.0, 0.0)
+apf[:2, :] = 0
+apf[-2:, :] = 0
+apf[:, :2] = 0
+apf[:, -2:] = 0
+street = _rng.rand(HEIGHT, WIDTH) < 0.8
+attractions = _rng.uniform(-1, 1, (HEIGHT, WIDTH, 6)).astype(np.float32)
+road_mask = ~(apf < 40)
+real_tra = np.array(["{}-{}".format(x, y) for x in range(5, 55, 7) for y in range(5, 65, 9) if apf[x, y] >= 40])
+landscape = [box(0, 0, 200, 6000), box(20, 10, 100, 3000)] * 6
+SEED = 42
+NUMBER_OF_TRAJECTORIES = 12
+
+_neighbours = build_neighbours_mask(street)
+# half of the cells on the street have precomputed attractions, the others are computed point by point
+_keys = np.flatnonzero(_neighbours.ravel() != 0)[::2]
+
+
+class FakeSubMatrix(object):
+    """
+    Same interface of SubMatrix used by the rollout
+    """
+
+    def neighbours_on_street(self, positions):
+        return _neighbours[positions[:, 0], positions[:, 1]]
+
+    def attractions(self, positions):
+        flat = positions[:, 0] * WIDTH + positions[:, 1]
+        i = np.minimum(np.searchsorted(_keys, flat), len(_keys) - 1)
+        return attractions[positions[:, 0], positions[:, 1]], _keys[i] == flat
+
+    def return_distance_from_point(self, current_position):
+        return [attractions[current_position.x, current_position.y, i] for i in range(6)]
+
+
+def _elu_activation(z):
+    return z if z > 0.0 else math.exp(z) - 1
+
+
+def _selu_activation(z):
+    lam = 1.0507009873554804934193349852946
+    alpha = 1.6732632423543772848170429916717
+    return lam * z if z > 0.0 else lam * alpha * (math.exp(z) - 1)
+
+
+def config():
+    """
+    NEAT config of the experiments
+    :return: neat.Config
+    """
+    c = neat.Config(NoveltyGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                    CONFIG_PATH)
+    c.genome_config.add_activation('elu', _elu_activation)
+    c.genome_config.add_activation('selu', _selu_activation)
+    return c
+
+
+def genomes(number, seed=0, mutations=30):
+    """
+    Random genomes, mutated a few times to have hidden nodes
+    :param number: number of genomes
+    :param seed: seed of the mutations
+    :param mutations: mutations per genome
+    :return: config and list of genomes
+    """
+    random.seed(seed)
+    c = config()
+    out = []
+    for key in range(number):
+        genome = NoveltyGenome(key)
+        genome.configure_new(c.genome_config)
+        for _ in range(mutations):
+            genome.mutate(c.genome_config)
+        out.append(genome)
+    return c, out
+
+
+# config of the evaluation functions, loaded once per process
+_config = None
+
+
+def world_arguments():
+    # arguments of generate_trajectories read from the world
+    return dict(real_tra=real_tra, road_mask=road_mask, sub_matrix=FakeSubMatrix(), fitness_landscape=landscape,
+                random_initial_point=True, point_distance=[0])
+
+
+def trajectory_function(genome, indexes, generation=None):
+    # same as eval_trajectories, on the fake world
+    global _config
+    if _config is None:
+        _config = config()
+    net = FeedForwardNetworkMine.create(genome, _config)
+    return generate_trajectories(net=net, indexes=indexes, number_to_generate=NUMBER_OF_TRAJECTORIES,
+                                 random_streams=random_streams(seed=SEED, generation=generation,
+                                                               genome_key=genome.key, number=NUMBER_OF_TRAJECTORIES),
+                                 **world_arguments())
+
+
+def reduce_function(partial, generation=None):
+    # same record as reduce_trajectories, the trajectories are sent back
+    all_the_fitness, behaviours_generated, all_the_directions, all_tra_generated = partial
+    total_data_together = combine_general_fitness(all_the_fitness=all_the_fitness,
+                                                  behaviours_generated=behaviours_generated,
+                                                  all_the_directions=all_the_directions,
+                                                  all_tra_generated=all_tra_generated, penalty_fitness=True)
+    result = make_result(real_fitness=np.mean(total_data_together[0]),
+                         behaviour=np.mean(np.array(total_data_together[1]), axis=0),
+                         variance=np.mean(total_data_together[3]), added_constraint=total_data_together[4],
+                         value_direction=float(np.mean(total_data_together[6])))
+    return result, total_data_together
+
+
+def eval_function(genome, generation=None):
+    return reduce_function(trajectory_function(genome, range(NUMBER_OF_TRAJECTORIES), generation=generation),
+                           generation=generation)
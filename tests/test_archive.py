@@ -0,0 +1,111 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import pickle
+import random
+from math import inf
+
+import numpy as np
+import pytest
+
+from src.Algorithms.support import Archive
+
+
+class ListArchive(object):
+    """
+    The list the archive was before the ring buffer
+    """
+
+    def __init__(self, maxsize=inf):
+        self.maxsize = maxsize
+        self.items = []
+
+    def insert(self, item):
+        self.items.append(np.ravel(item))
+        if len(self.items) > self.maxsize:
+            del self.items[0]
+
+    def remove(self, index):
+        del self.items[index]
+
+
+def _assert_same(archive, expected):
+    assert len(archive) == len(expected.items)
+    assert np.array_equal(archive.behaviours().reshape((-1, 5)), np.array(expected.items).reshape((-1, 5)))
+    assert [el.tolist() for el in archive] == [el.tolist() for el in expected.items]
+    assert [el.tolist() for el in reversed(archive)] == [el.tolist() for el in reversed(expected.items)]
+    if len(expected.items) > 0:
+        assert np.array_equal(archive[-1], expected.items[-1])
+
+
+@pytest.mark.parametrize("maxsize", [inf, 1, 7, 40])
+def test_archive_as_the_list(maxsize):
+    rng = random.Random(maxsize)
+    archive = Archive(maxsize=maxsize)
+    expected = ListArchive(maxsize=maxsize)
+    for step in range(300):
+        if len(expected.items) > 0 and rng.random() < 0.2:
+            index = rng.randrange(-len(expected.items), len(expected.items))
+            archive.remove(index)
+            expected.remove(index)
+        else:
+            item = np.array([rng.uniform(0, 100) for _ in range(5)])
+            archive.insert(item)
+            expected.insert(item)
+        _assert_same(archive=archive, expected=expected)
+    with pytest.raises(IndexError):
+        archive.remove(len(expected.items))
+
+
+def test_archive_pickling():
+    archive = Archive(maxsize=10, prob_add=0.3)
+    expected = ListArchive(maxsize=10)
+    for i in range(25):
+        archive.insert(np.full(5, i, dtype=float))
+        expected.insert(np.full(5, i, dtype=float))
+    restored = pickle.loads(pickle.dumps(archive))
+    _assert_same(archive=restored, expected=expected)
+    # only the behaviours are saved, not the whole ring buffer
+    assert archive.__getstate__()["behaviours"].shape == (10, 5)
+    assert restored.__getstate__()["prob_add"] == 0.3
+    # the restored archive goes on as the original one
+    for i in range(25, 32):
+        restored.insert(np.full(5, i, dtype=float))
+        expected.insert(np.full(5, i, dtype=float))
+    _assert_same(archive=restored, expected=expected)
+
+    empty = pickle.loads(pickle.dumps(Archive()))
+    assert len(empty) == 0
+    assert empty.behaviours().shape[0] == 0
+
+
+class _Genome(object):
+    def __init__(self, fitness, behaviour):
+        self.fitness = fitness
+        self.behaviour = behaviour
+
+
+def test_archive_update_follows_prob_add():
+    population = {key: _Genome(fitness=float(key), behaviour=np.full(5, key, dtype=float)) for key in range(6)}
+    archive = Archive(maxsize=3, prob_add=1.)
+    for _ in range(5):
+        archive.update(population)
+    assert len(archive) == 3
+    assert all(any(np.array_equal(el, genome.behaviour) for genome in population.values()) for el in archive)
+    never = Archive(maxsize=3, prob_add=0.)
+    never.update(population)
+    assert len(never) == 0
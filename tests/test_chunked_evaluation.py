@@ -0,0 +1,127 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+import fake_world
+from fake_world import NUMBER_OF_TRAJECTORIES, SEED, eval_function, reduce_function, trajectory_function, \
+    world_arguments
+from src.Alg.FeedForwardNetworkMine import FeedForwardNetworkMine
+from src.Alg.ParallelEvaluatorMine import ParallelEvaluatorMine, _evaluate_chunk, combine_chunks
+from src.Fitness.GeneralFitness import combine_general_fitness, compute_general_fitness
+from src.Helpers.Funcs import random_streams
+from src.Helpers.Trajectory import TrajectoryBatch
+
+GENERATION = 3
+CONFIG, GENOMES = fake_world.genomes(4)
+
+
+def _chunked(genome, bounds):
+    # the chunks come back in any order
+    chunks = [_evaluate_chunk((trajectory_function, genome.key, genome, GENERATION, start, stop))
+              for start, stop in reversed(bounds)]
+    return combine_chunks([(start, value) for ignored_key, start, value in chunks])
+
+
+def _assert_same_evaluation(expected, result):
+    all_result_normal, all_results_behaviours, all_tra_generated, all_variance, average_converted_distance, \
+        single_fitness_data, all_the_directions = result
+    assert all_result_normal == expected[0]
+    assert len(all_results_behaviours) == len(expected[1])
+    for behaviour, expected_behaviour in zip(all_results_behaviours, expected[1]):
+        assert np.array_equal(behaviour, expected_behaviour)
+    assert [el.vect() for el in all_tra_generated] == [el.vect() for el in expected[2]]
+    assert all_variance == expected[3]
+    assert average_converted_distance == expected[4]
+    assert single_fitness_data == expected[5]
+    assert all_the_directions == expected[6]
+
+
+def test_chunked_evaluation_is_identical_to_the_whole_genome():
+    bounds = [(0, 3), (3, 7), (7, 11), (11, 12)]
+    for genome in GENOMES:
+        net = FeedForwardNetworkMine.create(genome, CONFIG)
+        expected = compute_general_fitness(net=net, number_to_generate=NUMBER_OF_TRAJECTORIES, penalty_fitness=True,
+                                           random_streams=random_streams(seed=SEED, generation=GENERATION,
+                                                                         genome_key=genome.key,
+                                                                         number=NUMBER_OF_TRAJECTORIES),
+                                           **world_arguments())
+        whole = trajectory_function(genome, range(NUMBER_OF_TRAJECTORIES), generation=GENERATION)
+        all_the_fitness, behaviours_generated, all_the_directions, all_tra_generated = _chunked(genome, bounds)
+
+        assert np.array_equal(all_the_fitness, whole[0])
+        assert np.array_equal(behaviours_generated, whole[1])
+        assert np.array_equal(all_the_directions, whole[2])
+        assert np.array_equal(all_tra_generated.offsets, whole[3].offsets)
+        assert np.array_equal(all_tra_generated.coordinates, whole[3].coordinates)
+        _assert_same_evaluation(expected, combine_general_fitness(
+            all_the_fitness=all_the_fitness, behaviours_generated=behaviours_generated,
+            all_the_directions=all_the_directions, all_tra_generated=all_tra_generated, penalty_fitness=True))
+
+
+def test_chunked_evaluator_is_identical_to_the_whole_genome():
+    results = []
+    for chunked in (False, True):
+        chunks = {}
+        if chunked:
+            chunks = dict(trajectory_function=trajectory_function, reduce_function=reduce_function,
+                          number_of_trajectories=NUMBER_OF_TRAJECTORIES)
+        pool = ThreadPool(processes=2)
+        evaluator = ParallelEvaluatorMine(num_workers=2, eval_function=eval_function, fitness_definition="normal",
+                                          pool=pool, **chunks)
+        genomes = [(genome.key, genome) for genome in GENOMES]
+        evaluator.evaluate(genomes=genomes, config=(CONFIG, [], GENERATION))
+        pool.close()
+        pool.join()
+        results.append([(genome.fitness, genome.behaviour, genome.all_the_data) for _, genome in genomes])
+    for (whole_fitness, whole_behaviour, whole_data), (fitness, behaviour, data) in zip(*results):
+        assert fitness == whole_fitness
+        assert np.array_equal(behaviour, whole_behaviour)
+        _assert_same_evaluation(whole_data, data)
+
+
+def test_combine_chunks_without_trajectories():
+    genome = GENOMES[0]
+    chunks = [(start, trajectory_function(genome, range(start, stop), generation=GENERATION))
+              for start, stop in [(6, 12), (0, 6)]]
+    whole = trajectory_function(genome, range(NUMBER_OF_TRAJECTORIES), generation=GENERATION)
+    # the workers do not send the trajectories back when they are not needed
+    chunks = [(start, value[:3] + (None,)) for start, value in chunks]
+    all_the_fitness, behaviours_generated, all_the_directions, all_tra_generated = combine_chunks(chunks)
+    assert all_tra_generated is None
+    assert np.array_equal(all_the_fitness, whole[0])
+    assert np.array_equal(behaviours_generated, whole[1])
+    assert np.array_equal(all_the_directions, whole[2])
+
+    # one chunk without trajectories is enough to not have them
+    chunks[0] = (chunks[0][0], trajectory_function(genome, range(6, 12), generation=GENERATION))
+    assert combine_chunks(chunks)[3] is None
+
+
+def test_concatenate_empty_batches():
+    empty = TrajectoryBatch.concatenate([])
+    assert len(empty) == 0
+    assert np.array_equal(empty.offsets, [0])
+    assert empty.coordinates.shape == (0, 2)
+
+    batch = TrajectoryBatch.from_trajectories([np.array([[1, 2], [1, 3]]), np.zeros((0, 2)), np.array([[4, 5]])])
+    joined = TrajectoryBatch.concatenate([TrajectoryBatch.from_trajectories([]), batch,
+                                          TrajectoryBatch.from_trajectories([np.zeros((0, 2))])])
+    assert np.array_equal(joined.lengths(), [2, 0, 1, 0])
+    assert [el.vect() for el in joined] == [[[1, 2], [1, 3]], [], [[4, 5]], []]
@@ -0,0 +1,128 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import pytest
+
+import fake_world
+from src.Alg.CheckpointerMine import CheckpointerMine
+from src.Alg.EvaluationJournal import EvaluationJournal
+from src.Alg.ParallelEvaluatorMine import ParallelEvaluatorMine, make_result
+from src.Alg.ReporterMine import MineReporter
+from src.Alg.population_mine import PopulationWithNovelty
+
+SEED = 7
+GENERATIONS_BEFORE_THE_CRASH = 2
+EVALUATIONS_BEFORE_THE_CRASH = 12
+
+
+class Crash(Exception):
+    pass
+
+
+class FakeMlflow(object):
+    def log_metric(self, key, value):
+        pass
+
+
+class Evaluation(object):
+    """
+    Fake evaluation, depending on the generation and on the genome as the real one, that records what it evaluates
+    and crashes after a number of evaluations
+    """
+
+    def __init__(self, crash_after=None):
+        self.evaluated = []
+        self._crash_after = crash_after
+
+    def __call__(self, genome, generation=None):
+        if self._crash_after is not None and len(self.evaluated) >= self._crash_after:
+            raise Crash()
+        self.evaluated.append((generation, genome.key))
+        rng = np.random.RandomState([SEED, generation, genome.key])
+        return make_result(real_fitness=rng.uniform(0, 100), behaviour=rng.uniform(0, 100, 5),
+                           variance=rng.uniform(), added_constraint=rng.uniform(), value_direction=rng.uniform()), None
+
+
+def _config():
+    config = fake_world.config()
+    # new children in every generation, not only elites
+    config.pop_size = 20
+    config.reproduction_config.elitism = 2
+    config.species_set_config.compatibility_threshold = 10.
+    return config
+
+
+def _run(population, journal, evaluation, generations, output, compact):
+    logger = logging.getLogger("test")
+    population.add_reporter(MineReporter(show_species_detail=True, logger=logger, mlflow=FakeMlflow()))
+    checkpointer = CheckpointerMine(generation_interval=1, time_interval_seconds=None,
+                                    filename_prefix="{}/neat-checkpoint-".format(output), archive=population.archive,
+                                    compact=compact, reproduction=population.reproduction)
+    population.add_reporter(checkpointer)
+    pool = ThreadPool(processes=1)
+    evaluator = ParallelEvaluatorMine(num_workers=1, eval_function=evaluation, fitness_definition="normal", k=3,
+                                      pool=pool, max_attempts=1, journal=journal)
+    try:
+        population.run(evaluator.evaluate, generations)
+    finally:
+        checkpointer.close()
+        pool.close()
+        pool.join()
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_restored_run_does_not_evaluate_again(tmp_path, compact):
+    output = tmp_path
+    config = _config()
+    journal_path = str(output / "evaluation_journal.dat")
+
+    journal = EvaluationJournal(path=journal_path, seed=SEED, settings="fake")
+    population = PopulationWithNovelty(config=config, prob_add=0.1, output_directory=str(output))
+    crashing = Evaluation(crash_after=GENERATIONS_BEFORE_THE_CRASH * config.pop_size + EVALUATIONS_BEFORE_THE_CRASH)
+    with pytest.raises(RuntimeError):
+        _run(population=population, journal=journal, evaluation=crashing,
+             generations=GENERATIONS_BEFORE_THE_CRASH + 1, output=output, compact=compact)
+    journal.close()
+    crashed_generation = GENERATIONS_BEFORE_THE_CRASH
+    evaluated_before_the_crash = {key for generation, key in crashing.evaluated if generation == crashed_generation}
+    assert len(evaluated_before_the_crash) == EVALUATIONS_BEFORE_THE_CRASH
+
+    restored = CheckpointerMine.restore_checkpoint_with_novelty(
+        filename="{}/neat-checkpoint-{}".format(output, crashed_generation - 1), output_directory=str(output),
+        prob_add=0.1, config=config)
+    assert restored.generation == crashed_generation
+    assert set(restored.population) == set(population.population)
+    genomes = dict(restored.population)
+
+    journal = EvaluationJournal(path=journal_path, seed=SEED, settings="fake")
+    resumed = Evaluation()
+    _run(population=restored, journal=journal, evaluation=resumed, generations=1, output=output,
+         compact=compact)
+    journal.close()
+    # the genomes evaluated before the crash come from the journal, only the others are evaluated
+    assert {generation for generation, key in resumed.evaluated} == {crashed_generation}
+    evaluated_again = evaluated_before_the_crash & {key for generation, key in resumed.evaluated}
+    assert len(evaluated_again) == 0
+    assert len(resumed.evaluated) == config.pop_size - EVALUATIONS_BEFORE_THE_CRASH
+    assert journal.replayed == EVALUATIONS_BEFORE_THE_CRASH
+    # the fitness of the restored generation is the one of the interrupted run
+    for key in evaluated_before_the_crash:
+        assert genomes[key].real_fitness == Evaluation()(genomes[key], generation=crashed_generation)[0]["real_fitness"]
@@ -0,0 +1,72 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import random
+
+import neat
+import numpy as np
+
+import fake_world
+from src.Alg.FeedForwardNetworkMine import FeedForwardNetworkMine
+
+ACTIVATIONS = ['abs', 'clamped', 'cube', 'elu', 'exp', 'gauss', 'hat', 'identity', 'inv', 'log', 'relu', 'selu',
+               'sigmoid', 'sin', 'softplus', 'square', 'tanh']
+AGGREGATIONS = ['sum', 'max', 'maxabs', 'mean', 'median', 'min', 'product']
+
+
+def _random_genomes(number, activations, aggregations):
+    """
+    Random genomes with hidden nodes, some connections disabled, and activations and aggregations picked at random
+    """
+    config, genomes = fake_world.genomes(number, seed=3, mutations=60)
+    rng = random.Random(5)
+    for genome in genomes:
+        for node in genome.nodes.values():
+            node.activation = rng.choice(activations)
+            node.aggregation = rng.choice(aggregations)
+        for connection in genome.connections.values():
+            if rng.random() < 0.2:
+                connection.enabled = False
+    return config, genomes
+
+
+def _assert_same_outputs(config, genomes, inputs):
+    for genome in genomes:
+        expected = neat.nn.FeedForwardNetwork.create(genome, config)
+        network = FeedForwardNetworkMine.create(genome, config)
+        outputs = network.activate_batch(inputs)
+        assert outputs.shape == (inputs.shape[0], len(config.genome_config.output_keys))
+        for row, output in zip(inputs, outputs):
+            np.testing.assert_allclose(output, expected.activate(row.tolist()), rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(network.activate(inputs[0].tolist()), outputs[0], rtol=0, atol=0)
+
+
+def test_activate_batch_as_neat():
+    config, genomes = _random_genomes(number=30, activations=ACTIVATIONS, aggregations=AGGREGATIONS)
+    assert any(not connection.enabled for genome in genomes for connection in genome.connections.values())
+    assert any(len(genome.nodes) > len(config.genome_config.output_keys) for genome in genomes)
+    inputs = np.random.RandomState(0).uniform(-2, 2, (50, len(config.genome_config.input_keys)))
+    _assert_same_outputs(config=config, genomes=genomes, inputs=inputs)
+
+
+def test_activate_batch_with_custom_functions():
+    # the functions that are not in neat-python are applied row by row
+    config, genomes = _random_genomes(number=10, activations=['double', 'tanh'], aggregations=['sum', 'range'])
+    config.genome_config.add_activation('double', lambda z: 2 * z)
+    config.genome_config.add_aggregation('range', lambda x: max(x) - min(x))
+    inputs = np.random.RandomState(1).uniform(-2, 2, (20, len(config.genome_config.input_keys)))
+    _assert_same_outputs(config=config, genomes=genomes, inputs=inputs)
@@ -0,0 +1,65 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import numpy as np
+
+from src.Fitness.GeneralFitness import combine_general_fitness
+from src.Fitness.ValueGraphFitness import MAX_TOTAL_FITNESS
+
+
+def _baseline_variance(all_the_fitness, behaviours_generated):
+    # the loop replaced by the running sums: after every trajectory, the sum of the mean behaviour so far if more
+    # than one of the trajectories so far is good
+    all_results_behaviours = []
+    all_result_normal = []
+    all_variance = []
+    for i in range(behaviours_generated.shape[0]):
+        all_results_behaviours.append(behaviours_generated[i])
+        all_result_normal.append(float(all_the_fitness[i][0]))
+        good_values = [all_results_behaviours[i] for i in range(len(all_result_normal))
+                       if all_result_normal[i] >= MAX_TOTAL_FITNESS]
+        if len(good_values) > 1:
+            mean_data = np.mean(np.array(all_results_behaviours), axis=0)
+            variance_data_good_values = np.sum(mean_data)
+        else:
+            variance_data_good_values = 0
+        all_variance.append(variance_data_good_values)
+    return all_variance
+
+
+def test_variance_as_the_loop():
+    for seed, number in [(0, 1), (1, 2), (2, 30), (3, 200)]:
+        rng = np.random.RandomState(seed)
+        all_the_fitness = rng.uniform(0, 600, (number, 4))
+        # some trajectories reach the max fitness
+        all_the_fitness[rng.rand(number) < 0.3, 0] = MAX_TOTAL_FITNESS
+        behaviours_generated = rng.uniform(0, 100, (number, 5))
+        result = combine_general_fitness(all_the_fitness=all_the_fitness, behaviours_generated=behaviours_generated,
+                                         all_the_directions=rng.uniform(0, 360, number), all_tra_generated=None,
+                                         penalty_fitness=False)
+        expected = _baseline_variance(all_the_fitness=all_the_fitness, behaviours_generated=behaviours_generated)
+        assert len(result[3]) == number
+        assert [float(el) for el in result[3]] == [float(el) for el in expected]
+
+
+def test_variance_without_good_trajectories():
+    rng = np.random.RandomState(4)
+    result = combine_general_fitness(all_the_fitness=rng.uniform(0, 100, (10, 4)),
+                                     behaviours_generated=rng.uniform(0, 100, (10, 5)),
+                                     all_the_directions=rng.uniform(0, 360, 10), all_tra_generated=None,
+                                     penalty_fitness=False)
+    assert result[3] == [0] * 10
@@ -0,0 +1,71 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import numpy as np
+
+from src.Algorithms.support import KDTREE_THRESHOLD, compute_matrix_distances, compute_novelty_scores, \
+    get_novelty_score
+
+
+def _baseline_novelty(data_a, data_b, k):
+    # the loops replaced by the vectorized distances and the k-d tree
+    matrix = np.zeros((len(data_a), len(data_b)))
+    for i in range(len(data_a)):
+        for j in range(len(data_b)):
+            vector_a = data_a[i][0]
+            vector_b = data_b[j][0]
+            matrix[i, j] = np.sqrt(np.sum((vector_a - vector_b) ** 2))
+    if k > matrix.shape[0]:
+        k = matrix.shape[0] - 1
+    values = []
+    for i in range(matrix.shape[0]):
+        vector = matrix[i]
+        idx = np.argpartition(vector, k)
+        values.append(float(np.mean(vector[idx[:k]])))
+    return matrix, values
+
+
+def _behaviours(population, archive, seed):
+    # as the evaluator: list of behaviours of the population, matrix of population and archive
+    rng = np.random.RandomState(seed)
+    data_a = [el for el in rng.uniform(0, 1000, (population, 5))]
+    data_b = np.vstack([np.array(data_a), rng.uniform(0, 1000, (archive, 5))])
+    return data_a, data_b
+
+
+def test_matrix_distances_as_the_loops():
+    data_a, data_b = _behaviours(population=20, archive=30, seed=0)
+    matrix, values = _baseline_novelty(data_a=data_a, data_b=data_b, k=15)
+    assert np.array_equal(compute_matrix_distances(data_a=data_a, data_b=data_b, chunk=7), matrix)
+    assert get_novelty_score(data=matrix, k=15) == values
+
+
+def test_novelty_on_both_sides_of_the_threshold():
+    for population, k in [(20, 15), (10, 15)]:
+        for size in [KDTREE_THRESHOLD - 1, KDTREE_THRESHOLD, KDTREE_THRESHOLD + 100]:
+            data_a, data_b = _behaviours(population=population, archive=size - population, seed=size)
+            assert len(data_b) == size
+            ignored_matrix, expected = _baseline_novelty(data_a=data_a, data_b=data_b, k=k)
+            scores = compute_novelty_scores(data_a=data_a, data_b=data_b, k=k)
+            if size < KDTREE_THRESHOLD:
+                assert scores == expected
+            else:
+                np.testing.assert_allclose(scores, expected, rtol=1e-12)
+            # the other path gives the same scores
+            other = compute_novelty_scores(data_a=data_a, data_b=data_b, k=k,
+                                           kdtree_threshold=size + 1 if size >= KDTREE_THRESHOLD else 1)
+            np.testing.assert_allclose(other, expected, rtol=1e-12)
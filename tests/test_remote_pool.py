@@ -0,0 +1,109 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import multiprocessing
+import socket
+import threading
+import time
+from multiprocessing import AuthenticationError
+
+import numpy as np
+import pytest
+
+import fake_world
+from fake_world import NUMBER_OF_TRAJECTORIES, eval_function, reduce_function, trajectory_function
+from src.Alg.ParallelEvaluatorMine import ParallelEvaluatorMine
+from src.Alg.RemotePool import AUTHKEY_VARIABLE, EvaluationManager, RemotePool, get_authkey, run_worker
+
+KEY = b"test key"
+
+
+def test_authkey_is_required(monkeypatch):
+    monkeypatch.delenv(AUTHKEY_VARIABLE, raising=False)
+    with pytest.raises(ValueError):
+        get_authkey(None)
+    with pytest.raises(ValueError):
+        get_authkey("")
+    assert get_authkey("secret") == b"secret"
+    monkeypatch.setenv(AUTHKEY_VARIABLE, "from the environment")
+    assert get_authkey(None) == b"from the environment"
+    assert get_authkey("secret") == b"secret"
+
+
+def test_pool_stops_listening_when_joined():
+    pool = RemotePool(address=("127.0.0.1", 0), authkey=KEY)
+    worker = threading.Thread(target=run_worker, args=(pool.address, KEY), daemon=True)
+    worker.start()
+    assert pool.apply_async(pow, (2, 5)).get(10) == 32
+
+    # the second task waits in the queue until the worker is free
+    first = pool.apply_async(time.sleep, (1,))
+    second = pool.apply_async(time.sleep, (1,))
+    time.sleep(0.5)
+    started = first.started()
+    assert started is not None
+    assert second.started() is None
+    first.get(10)
+    time.sleep(0.2)
+    assert second.started() - started > 0.4
+    second.get(10)
+
+    with pytest.raises(AuthenticationError):
+        EvaluationManager(address=pool.address, authkey=b"wrong key").connect()
+
+    pool.close()
+    pool.join(timeout=10)
+    worker.join(10)
+    assert not worker.is_alive()
+    with pytest.raises(ConnectionRefusedError):
+        socket.create_connection(pool.address, timeout=1).close()
+
+
+def _evaluate(genomes, **kwargs):
+    evaluator = ParallelEvaluatorMine(num_workers=3, eval_function=eval_function, fitness_definition="normal", k=3,
+                                      persistent_workers=True, **kwargs)
+    population = [(genome.key, genome) for genome in genomes]
+    evaluator.evaluate(genomes=population, config=(None, [], 5))
+    return [(genome.fitness, genome.novelty_score, genome.behaviour) for _, genome in population]
+
+
+def test_population_evaluated_by_remote_workers():
+    config, genomes = fake_world.genomes(8)
+    local = _evaluate(genomes)
+
+    pool = RemotePool(address=("127.0.0.1", 0), authkey=KEY)
+    workers = [multiprocessing.Process(target=run_worker, args=(pool.address, KEY)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    pool.wait_for_workers(number=3, timeout=30)
+    assert pool.workers == 3
+    # as the remote mode, the trajectories of a genome are split between the workers
+    remote = _evaluate(genomes, pool=pool, trajectory_function=trajectory_function, reduce_function=reduce_function,
+                       number_of_trajectories=NUMBER_OF_TRAJECTORIES)
+
+    pool.close()
+    pool.join(timeout=30)
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+    with pytest.raises(ConnectionRefusedError):
+        socket.create_connection(pool.address, timeout=1).close()
+
+    for (local_fitness, local_novelty, local_behaviour), (fitness, novelty, behaviour) in zip(local, remote):
+        assert fitness == local_fitness
+        assert novelty == local_novelty
+        assert np.array_equal(behaviour, local_behaviour)
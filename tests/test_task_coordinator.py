@@ -0,0 +1,213 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from multiprocessing import TimeoutError
+
+import pytest
+
+from src.Alg import TaskCoordinator as coordinator_module
+from src.Alg.TaskCoordinator import TaskCoordinator
+
+
+class FakeClock(object):
+    """
+    Replaces the time module of the coordinator, sleeping moves the time forward
+    """
+
+    def __init__(self):
+        self.now = 0.
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeResult(object):
+    def __init__(self, clock, finish, value, error):
+        self._clock = clock
+        self._finish = finish
+        self._value = value
+        self._error = error
+
+    def ready(self):
+        return self._clock.now >= self._finish
+
+    def get(self, timeout=None):
+        if not self.ready():
+            raise TimeoutError()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class FakeRemoteResult(FakeResult):
+    """
+    As RemoteResult, it tells when a worker took the task
+    """
+
+    def __init__(self, clock, start, finish, value, error):
+        super().__init__(clock=clock, finish=finish, value=value, error=error)
+        self._start = start
+
+    def started(self):
+        return self._start if self._clock.now >= self._start else None
+
+
+# the worker dies, its result is never ready but the pool replaces it
+DEAD = object()
+
+
+class FakePool(object):
+    """
+    Pool of num_workers workers where a task waits in the queue until a worker is free, as multiprocessing.Pool.
+    plan gives for every task the list of its attempts, as seconds to run (None for a worker that hangs) and error
+    """
+
+    def __init__(self, clock, num_workers, plan, remote=False):
+        self._clock = clock
+        self._remote = remote
+        self._plan = plan
+        self._submitted = {}
+        self._free_at = [0.] * num_workers
+        # seconds every task waited in the queue of the pool
+        self.waits = []
+
+    def apply_async(self, function, arguments, keywords):
+        name = arguments[0]
+        attempt = self._submitted.get(name, 0)
+        self._submitted[name] = attempt + 1
+        seconds, error = self._plan[name][attempt]
+        worker = min(range(len(self._free_at)), key=lambda el: self._free_at[el])
+        start = max(self._clock.now, self._free_at[worker])
+        finish = float("inf") if seconds is None else start + seconds
+        self._free_at[worker] = finish
+        self.waits.append(start - self._clock.now)
+        if error is DEAD:
+            finish = float("inf")
+        if self._remote:
+            return FakeRemoteResult(clock=self._clock, start=start, finish=finish,
+                                    value=function(*arguments, **keywords), error=error)
+        return FakeResult(clock=self._clock, finish=finish, value=function(*arguments, **keywords), error=error)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(coordinator_module, "time", clock)
+    return clock
+
+
+def _tasks(names):
+    return {name: (str.upper, (name,), {}) for name in names}
+
+
+def test_all_the_tasks_are_run(clock):
+    pool = FakePool(clock=clock, num_workers=2, plan={name: [(1., None)] for name in "abcde"})
+    completed = []
+    results, statistics = TaskCoordinator(pool=pool, num_workers=2).run(
+        tasks=_tasks("abcde"), on_result=lambda key, value: completed.append(key))
+    assert results == {name: name.upper() for name in "abcde"}
+    assert sorted(completed) == list("abcde")
+    assert all(attempts == 1 for attempts, seconds in statistics.values())
+    # one task per worker
+    assert max(pool.waits) == 0
+
+
+def test_failed_task_is_sent_again(clock):
+    pool = FakePool(clock=clock, num_workers=2, plan={"a": [(1., ValueError("broken")), (1., None)],
+                                                      "b": [(1., None)]})
+    results, statistics = TaskCoordinator(pool=pool, num_workers=2).run(tasks=_tasks("ab"))
+    assert results == {"a": "A", "b": "B"}
+    assert statistics["a"][0] == 2
+    assert statistics["b"][0] == 1
+
+
+def test_task_failing_every_attempt(clock):
+    pool = FakePool(clock=clock, num_workers=2, plan={"a": [(1., ValueError("broken"))] * 3})
+    with pytest.raises(RuntimeError):
+        TaskCoordinator(pool=pool, num_workers=2, max_attempts=3).run(tasks=_tasks("a"))
+
+
+def test_task_lost_at_the_deadline(clock):
+    plan = {name: [(4., None)] for name in "bcdef"}
+    plan["a"] = [(None, None), (4., None)]
+    pool = FakePool(clock=clock, num_workers=2, plan=plan)
+    results, statistics = TaskCoordinator(pool=pool, num_workers=2, deadline=10.).run(tasks=_tasks("abcdef"))
+    assert results == {name: name.upper() for name in "abcdef"}
+    assert statistics["a"][0] == 2
+    assert all(statistics[name][0] == 1 for name in "bcdef")
+    # the worker hanging on the first attempt of a is not given other tasks
+    assert max(pool.waits) == 0
+    assert statistics["a"][1] < 10.
+
+
+def test_task_lost_at_every_attempt(clock):
+    pool = FakePool(clock=clock, num_workers=3, plan={"a": [(None, None)] * 2})
+    with pytest.raises(TimeoutError):
+        TaskCoordinator(pool=pool, num_workers=3, deadline=10., max_attempts=2).run(tasks=_tasks("a"))
+
+
+def test_only_dead_workers_left(clock):
+    # when all the workers look taken by lost copies a task is still sent, the workers may have died
+    plan = {"a": [(1., DEAD), (1., None)], "b": [(1., DEAD), (1., None)]}
+    pool = FakePool(clock=clock, num_workers=2, plan=plan)
+    results, statistics = TaskCoordinator(pool=pool, num_workers=2, deadline=10.).run(tasks=_tasks("ab"))
+    assert results == {"a": "A", "b": "B"}
+    assert statistics["a"][0] == 2
+    assert statistics["b"][0] == 2
+
+
+def test_straggler_gets_a_second_copy(clock, monkeypatch):
+    monkeypatch.setattr(coordinator_module, "MIN_STRAGGLER_SECONDS", 5.)
+    plan = {name: [(1., None)] for name in "bcdefg"}
+    plan["a"] = [(100., None), (1., None)]
+    pool = FakePool(clock=clock, num_workers=3, plan=plan)
+    coordinator = TaskCoordinator(pool=pool, num_workers=3)
+    results, statistics = coordinator.run(tasks=_tasks("abcdefg"))
+    assert results == {name: name.upper() for name in "abcdefg"}
+    # the second copy wins long before the first one finishes
+    assert statistics["a"][0] == 2
+    assert clock.now < 10.
+    assert max(pool.waits) == 0
+
+    # the losing copy still keeps its worker busy in the next run
+    plan.update({name: [(1., None)] for name in "hijk"})
+    coordinator.run(tasks=_tasks("hijk"))
+    assert max(pool.waits) == 0
+    assert clock.now < 100.
+
+
+def test_tasks_in_flight_follow_the_connected_workers(clock):
+    pool = FakePool(clock=clock, num_workers=1, plan={name: [(1., None)] for name in "abc"})
+    # as a RemotePool with one worker connected
+    pool.workers = 1
+    results, statistics = TaskCoordinator(pool=pool, num_workers=4, deadline=1.5).run(tasks=_tasks("abc"))
+    assert results == {name: name.upper() for name in "abc"}
+    assert max(pool.waits) == 0
+    assert all(attempts == 1 for attempts, seconds in statistics.values())
+
+
+def test_attempt_starts_when_a_worker_takes_it(clock):
+    # more tasks sent than workers, the time in the queue of the pool does not count for the deadline
+    pool = FakePool(clock=clock, num_workers=1, plan={name: [(1., None)] for name in "abcd"}, remote=True)
+    results, statistics = TaskCoordinator(pool=pool, num_workers=4, deadline=1.5).run(tasks=_tasks("abcd"))
+    assert results == {name: name.upper() for name in "abcd"}
+    assert max(pool.waits) > 1.5
+    assert all(attempts == 1 for attempts, seconds in statistics.values())
+    assert all(seconds < 1.5 for attempts, seconds in statistics.values())
@@ -0,0 +1,81 @@
+"""
+TrajectoriesNEAT. Towards a human-like movements generator based on environmental features
+Copyright (C) 2020  Alessandro Zonta (a.zonta@vu.nl)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import numpy as np
+import pandas as pd
+
+from src.Fitness.GeneralFitness import combine_general_fitness
+from src.Fitness.TrajectoryOverlap import compute_overlap_ratios
+from src.Fitness.ValueGraphFitness import convert, MAX_FITNESS
+from src.Helpers.Trajectory import TrajectoryBatch
+
+STEPS = np.array([[-1, -1], [-1, 0], [-1, 1], [0, -1], [0, 1], [1, -1], [1, 0], [1, 1]])
+
+
+def _random_walks(number, seed):
+    """
+    Random walks starting from few points, so they cross each other and themselves
+    """
+    rng = np.random.RandomState(seed)
+    walks = []
+    for _ in range(number):
+        start = rng.randint(0, 4, 2) * 3 + 100
+        steps = STEPS[rng.randint(0, len(STEPS), rng.randint(1, 60))]
+        walks.append(np.vstack([start, start + np.cumsum(steps, axis=0)]))
+    return TrajectoryBatch.from_trajectories(walks)
+
+
+def _baseline_ratios(trajectories):
+    # the drop_duplicates computation replaced by compute_overlap_ratios
+    values_of_same_elements = []
+    for i in range(len(trajectories)):
+        first_tra = trajectories[i].vect()
+        for j in range(i + 1, len(trajectories)):
+            second_tra = trajectories[j].vect()
+            tot = [*first_tra, *second_tra]
+            equality = pd.DataFrame(np.array(tot).T).T.drop_duplicates(keep=False).to_numpy().shape[0] / len(tot)
+            values_of_same_elements.append(equality)
+    return np.array(values_of_same_elements)
+
+
+def test_overlap_ratios_as_drop_duplicates():
+    for seed in range(5):
+        trajectories = _random_walks(number=30, seed=seed)
+        ratios = compute_overlap_ratios(trajectories=trajectories)
+        expected = _baseline_ratios(trajectories=trajectories)
+        assert ratios.shape == expected.shape
+        assert np.array_equal(ratios, expected)
+
+
+def test_overlap_of_identical_and_disjoint_trajectories():
+    walk = np.array([[5, 5], [5, 6], [6, 7]])
+    trajectories = TrajectoryBatch.from_trajectories([walk, walk, walk + 100])
+    assert np.array_equal(compute_overlap_ratios(trajectories=trajectories), [0., 1., 1.])
+    assert compute_overlap_ratios(trajectories=TrajectoryBatch.from_trajectories([walk])).shape == (0,)
+
+
+def test_overlap_penalty_of_the_genome():
+    trajectories = _random_walks(number=30, seed=7)
+    rng = np.random.RandomState(7)
+    result = combine_general_fitness(all_the_fitness=rng.uniform(0, 600, (30, 4)),
+                                     behaviours_generated=rng.uniform(0, 1, (30, 5)),
+                                     all_the_directions=rng.uniform(0, 360, 30), all_tra_generated=trajectories,
+                                     penalty_fitness=True)
+    expected = convert(old_max=1, old_min=0, new_max=MAX_FITNESS, new_min=0,
+                       old_value=np.mean(_baseline_ratios(trajectories=trajectories)))
+    assert result[4] == expected
+    assert result[5][-1] == expected